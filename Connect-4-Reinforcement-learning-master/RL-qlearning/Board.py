@@ -1,16 +1,9 @@
-import pygame
-import random
-import argparse
+from Constants import GREEN, WHITE
+from GameLogic import GameLogic
+from Profiler import PROFILER
+from Slot import Slot
 
 
-# define some global variables
-BLUE = (0, 0, 255)
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BOARD_SIZE = (7,6)
-
 class ColumnFullException(Exception):
     """An exception that will be thrown if a column of the board is full"""
     def __init__(self, value):
@@ -20,7 +13,60 @@ class ColumnFullException(Exception):
         return repr(self.value)
 
 
-
+def encode_state(state):
+    """
+    Return a unique integer key for a 2d numerical board state. Every column
+    takes num_rows + 1 bits counted from the bottom slot up: the coins of
+    type 1 are set bits and one more bit marks the first empty slot
+    """
+    num_rows = len(state)
+    key = 0
+    for j in range(len(state[0])):
+        column = 0
+        height = 0
+        for i in range(num_rows - 1, -1, -1):
+            value = state[i][j]
+            if value == 0:
+                break
+            if value == 1:
+                column |= 1 << height
+            height += 1
+        key |= (column | (1 << height)) << (j * (num_rows + 1))
+
+    return key
+
+
+def decode_state_key(key, num_rows, num_columns):
+    """
+    Return the bitboards of the coins of type 1 and of all coins for an
+    encoded key, laid out like the bitboards of BitBoard
+    """
+    column_height = num_rows + 1
+    column_mask = (1 << column_height) - 1
+    first = 0
+    mask = 0
+    for j in range(num_columns):
+        shift = j * column_height
+        column = (key >> shift) & column_mask
+        filled = (1 << (column.bit_length() - 1)) - 1
+        first |= (column & filled) << shift
+        mask |= filled << shift
+
+    return (first, mask)
+
+
+def mirror_state_key(key, num_rows, num_columns):
+    """
+    Return the encoded key of the state mirrored from left to right
+    """
+    column_height = num_rows + 1
+    column_mask = (1 << column_height) - 1
+    mirrored = 0
+    for j in range(num_columns):
+        mirrored = (mirrored << column_height) | (key & column_mask)
+        key >>= column_height
+
+    return mirrored
 
 
 class Board():
@@ -28,6 +74,9 @@ class Board():
 
     MARGIN_X = 300
     MARGIN_Y = 150
+    # row and column steps along the horizontal, vertical, diagonal and
+    # anti-diagonal lines through a slot
+    LINE_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
 
     def __init__(self, num_rows, num_columns):
         """
@@ -42,47 +91,28 @@ class Board():
         self.num_slots_filled = 0
         self.last_visited_nodes = []
         self.last_value = 0
+        # number of coins in every column and the columns that are not full
+        self.column_heights = [0 for j in range(num_columns)]
+        self.available_actions = list(range(num_columns))
 
         self.state = [[0 for j in range(num_columns)] for i in range(num_rows)]
-        self.prev_state = None
         self.prev_move = (None, None, None)
-        # initialize the internal graph representation of the board
-        # where every node is connected to all the other nodes in the 8
-        # directions surrounding it to which it already contains pointers
-        self.representation = [[SlotTrackerNode() for j in range(num_columns)] for i in range(num_rows)]
-        for i in range(num_rows):
-            prev_row_index = i - 1
-            next_row_index = i + 1
-            for j in range(num_columns):
-                prev_col_index = j - 1
-                next_col_index = j + 1
-                current_node = self.representation[i][j]
-                if prev_row_index >= 0 and prev_col_index >=0:
-                    current_node.top_left = self.representation[prev_row_index][prev_col_index]
-                if prev_row_index >=0:
-                    current_node.top = self.representation[prev_row_index][j]
-                if prev_row_index >=0 and next_col_index < num_columns:
-                    current_node.top_right = self.representation[prev_row_index][next_col_index]
-                if prev_col_index >= 0:
-                    current_node.left = self.representation[i][prev_col_index]
-
-                if next_col_index < num_columns:
-                    current_node.right = self.representation[i][next_col_index]
-                if next_row_index < num_rows and prev_col_index >= 0:
-                    current_node.bottom_left = self.representation[next_row_index][prev_col_index]
-
-                if next_row_index < num_rows:
-                    current_node.bottom = self.representation[next_row_index][j]
-                if next_row_index < num_rows and next_col_index < num_columns:
-                    current_node.bottom_right = self.representation[next_row_index][next_col_index]
+        # columns played so far, in order
+        self.moves = []
+        # encode_state keys of the board before and after the last move,
+        # updated on every insert instead of encoding the state each time
+        self.state_key = encode_state(self.state)
+        self.prev_state_key = self.state_key
 
     def draw(self, background):
         """
-        Method to draw the entire board on the screen
+        Method to draw the entire board on the screen, returns the region
+        of the screen the board covers
         """
-        for i in range(self.num_rows):
-            for j in range(self.num_columns):
-                self.container[i][j].draw(background)
+        # imported here so that the board can be used without pygame
+        from Sprites import SPRITES
+        surface = SPRITES.empty_board(self.num_rows, self.num_columns, Slot.SIZE, Slot.SIZE, GREEN, WHITE)
+        return background.blit(surface, (Board.MARGIN_X, Board.MARGIN_Y))
 
     def get_slot(self, row_index, col_index):
         """
@@ -94,37 +124,38 @@ class Board():
         """
         Return True iff the column col_num on the board is filled up
         """
-        for i in range(len(self.container)):
-            # if a slot isn't filled then the column is not filled
-            if not self.container[i][col_num].check_slot_fill():
-                return False
-        return True
+        return self.column_heights[col_num] == self.num_rows
 
     def insert_coin(self, coin, background, game_logic):
         """
-        Insert the coin in the board and update board state and
-        internal representation
+        Insert the coin in the board and update board state
         """
         col_num = coin.get_column()
         if not self.check_column_fill(col_num):
             row_index = self.determine_row_to_insert(col_num)
             self.container[row_index][col_num].set_coin(coin)
-            if (self.prev_move[0] == None):
-                self.prev_state = [[0 for j in range(self.num_columns)] for i in range(self.num_rows)]
-            else:
-                (prev_row, prev_col, value) = self.prev_move
-                self.prev_state[prev_row][prev_col] = value
             self.prev_move = (row_index, col_num, coin.get_coin_type())
+            self.moves.append(col_num)
             self.state[row_index][col_num] = coin.get_coin_type()
+            self.update_state_key(col_num, coin.get_coin_type())
             self.update_slot_tracker(row_index, col_num, coin.get_coin_type())
+            self.update_column_height(col_num)
             self.num_slots_filled += 1
             self.last_value = coin.get_coin_type()
-            coin.drop(background, row_index)
+            if background is None:
+                # a headless coin is never drawn
+                coin.drop(background, row_index)
+            else:
+                PROFILER.start("render")
+                coin.drop(background, row_index)
+                PROFILER.stop()
 
         else:
             raise ColumnFullException('Column is already filled!')
 
+        PROFILER.start("win")
         result = game_logic.check_game_over()
+        PROFILER.stop()
 
         return result
 
@@ -132,11 +163,30 @@ class Board():
         """
         Determine the row in which the coin can be dropped into
         """
-        for i in range(len(self.container)):
-            if self.container[i][col_num].check_slot_fill():
-                return (i - 1)
+        return self.num_rows - 1 - self.column_heights[col_num]
+
+    def update_state_key(self, col_num, coin_type):
+        """
+        Update the encoded key for a coin of coin_type dropped into the column
+        col_num. The marker bit of the column moves up one slot, which adds
+        the bit of the new slot, and a coin of type 1 sets that bit as well
+        """
+        slot_bit = 1 << (col_num * (self.num_rows + 1) + self.column_heights[col_num])
+        self.prev_state_key = self.state_key
+        if coin_type == 1:
+            self.state_key += 2 * slot_bit
+        else:
+            self.state_key += slot_bit
 
-        return self.num_rows - 1
+    def update_column_height(self, col_num):
+        """
+        Count a coin dropped into the column col_num and stop offering the
+        column as a move once it is filled up
+        """
+        self.column_heights[col_num] += 1
+        if self.column_heights[col_num] == self.num_rows:
+            # replace rather than modify the list, callers may still hold it
+            self.available_actions = [j for j in self.available_actions if j != col_num]
 
     def get_dimensions(self):
         """
@@ -150,21 +200,18 @@ class Board():
         """
         return (self.total_slots == self.num_slots_filled)
 
-    def get_representation(self):
+    def check_win(self):
         """
-        Return the internal graph representation of the board
+        Return True iff the last coin inserted completed a winning sequence
         """
-        return self.representation
+        return len(self.last_visited_nodes) > 0
 
     def get_available_actions(self):
         """
-        Return the available moves
+        Return the available moves. The list is shared between calls and
+        must not be modified
         """
-        actions = []
-        for i in range(self.num_columns):
-            if (not self.check_column_fill(i)):
-                actions.append(i)
-        return actions
+        return self.available_actions
 
     def get_state(self):
         """
@@ -176,94 +223,281 @@ class Board():
 
     def get_prev_state(self):
         """
-        Return the previous state of the board
+        Return the previous state of the board, the state without the last
+        inserted coin
         """
-        result = tuple(tuple(x) for x in self.prev_state)
+        (prev_row, prev_col, value) = self.prev_move
+        result = [list(x) for x in self.state]
+        if prev_row is not None:
+            result[prev_row][prev_col] = 0
+        result = tuple(tuple(x) for x in result)
 
         return result
 
+    def get_state_key(self):
+        """
+        Return the encoded integer key of the state of the board
+        """
+        return self.state_key
+
+    def get_prev_state_key(self):
+        """
+        Return the encoded integer key of the previous state of the board
+        """
+        return self.prev_state_key
+
     def get_last_filled_information(self):
         """
-        Return the last visited nodes during the update step of the scores
-        within the internal graph representation and also return the last
-        coin type inserted into the board
+        Return the slots of the winning sequence completed by the last coin
+        inserted into the board, if any, and the last coin type inserted
         """
         return (self.last_visited_nodes, self.last_value)
 
     def update_slot_tracker(self, i, j, coin_type):
         """
-        Update the internal graph representation based on the latest insertion
-        into the board
+        Check the four lines through the coin of coin_type inserted at row i
+        and column j for a winning sequence. Each line is walked at most
+        WIN_SEQUENCE_LENGTH - 1 slots in either direction
         """
         self.last_visited_nodes = []
-        start_node = self.representation[i][j]
-        start_node.value = coin_type
-        self.traverse(start_node, coin_type, i, j, self.last_visited_nodes)
-        # reset all the nodes as if it hadn't been visited
-        for indices in self.last_visited_nodes:
-            self.representation[indices[0]][indices[1]].visited = False
-
-
-    def traverse(self, current_node, desired_value, i, j, visited_nodes):
-        """
-        Recursively update the scores of the relevant nodes based on its
-        adjacent nodes (slots). If a coin type 1 is inserted into the board in
-        some position i, j, then update all adjacent slots that contain 1 with
-        an updated score reflecting how many slots have 1 in a row in the top
-        left, top right, etc directions
-        """
-        current_node.visited = True
-        visited_nodes.append((i,j))
-        if current_node.top_left:
-            top_left_node = current_node.top_left
-            if top_left_node.value == desired_value:
-                current_node.top_left_score = top_left_node.top_left_score + 1
-                if not top_left_node.visited:
-                    self.traverse(top_left_node, desired_value, i - 1, j - 1, visited_nodes)
-        if current_node.top:
-            top_node = current_node.top
-            if top_node.value == desired_value:
-                current_node.top_score = top_node.top_score + 1
-                if not top_node.visited:
-                    self.traverse(top_node, desired_value, i - 1, j, visited_nodes)
-        if current_node.top_right:
-            top_right_node = current_node.top_right
-            if top_right_node.value == desired_value:
-                current_node.top_right_score = top_right_node.top_right_score + 1
-                if not top_right_node.visited:
-                    self.traverse(top_right_node, desired_value, i - 1, j + 1, visited_nodes)
-
-        if current_node.left:
-            left_node = current_node.left
-            if left_node.value == desired_value:
-                current_node.left_score = left_node.left_score + 1
-                if not left_node.visited:
-                    self.traverse(left_node, desired_value, i, j - 1, visited_nodes)
-
-        if current_node.right:
-            right_node = current_node.right
-            if right_node.value == desired_value:
-                current_node.right_score = right_node.right_score + 1
-                if not right_node.visited:
-                    self.traverse(right_node, desired_value, i, j + 1, visited_nodes)
-
-        if current_node.bottom_left:
-            bottom_left_node = current_node.bottom_left
-            if bottom_left_node.value == desired_value:
-                current_node.bottom_left_score = bottom_left_node.bottom_left_score + 1
-                if not bottom_left_node.visited:
-                    self.traverse(bottom_left_node, desired_value, i + 1, j - 1, visited_nodes)
-
-        if current_node.bottom:
-            bottom_node = current_node.bottom
-            if bottom_node.value == desired_value:
-                current_node.bottom_score = bottom_node.bottom_score + 1
-                if not bottom_node.visited:
-                    self.traverse(bottom_node, desired_value, i + 1, j, visited_nodes)
-
-        if current_node.bottom_right:
-            bottom_right_node = current_node.bottom_right
-            if bottom_right_node.value == desired_value:
-                current_node.bottom_right_score = bottom_right_node.bottom_right_score + 1
-                if not bottom_right_node.visited:
-                    self.traverse(bottom_right_node, desired_value, i + 1, j + 1, visited_nodes)
+        win_length = GameLogic.WIN_SEQUENCE_LENGTH
+        state = self.state
+        for (di, dj) in Board.LINE_DIRECTIONS:
+            line = [(i, j)]
+            for sign in (1, -1):
+                x = i + sign * di
+                y = j + sign * dj
+                while (len(line) < win_length and 0 <= x < self.num_rows and
+                       0 <= y < self.num_columns and state[x][y] == coin_type):
+                    line.append((x, y))
+                    x += sign * di
+                    y += sign * dj
+            if len(line) == win_length:
+                self.last_visited_nodes = line
+                return
+
+
+class BitBoardLayout():
+    """A class that holds the masks and shifts of the bitboards of a board
+    with num_rows rows and num_columns columns, shared by BitBoard and the
+    players that search on bitboards. Every column takes num_rows + 1 bits,
+    counted from the bottom slot up, the spare bit on top keeps the shifts
+    in alignment from wrapping into the next column"""
+
+    def __init__(self, num_rows, num_columns):
+        """
+        Compute the masks of a board of num_rows by num_columns
+        """
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+        self.column_height = num_rows + 1
+        # the bottom slot of every column and the marker bits of encode_state
+        # for an empty board
+        self.bottom_masks = [1 << (j * self.column_height) for j in range(num_columns)]
+        self.bottom_mask = sum(self.bottom_masks)
+        # the slots of every column and of the whole board
+        self.column_masks = [((1 << num_rows) - 1) << (j * self.column_height) for j in range(num_columns)]
+        self.board_mask = self.bottom_mask * ((1 << num_rows) - 1)
+        # vertical, diagonal, horizontal and anti-diagonal neighbour distances
+        self.win_shifts = (1, num_rows, self.column_height, num_rows + 2)
+
+    def alignment(self, position):
+        """
+        Return True iff the coins in position contain a winning sequence
+        """
+        for shift in self.win_shifts:
+            pairs = position & (position >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def legal_columns(self, mask):
+        """
+        Return the columns that are not full when mask holds every coin
+        """
+        possible = (mask + self.bottom_mask) & self.board_mask
+        return [j for j in range(self.num_columns) if possible & self.column_masks[j]]
+
+    def random_position(self, rng, max_moves):
+        """
+        Return the (position, mask) reached by playing a random number of
+        random moves, at most max_moves, from the empty board, stopping
+        before a move that would win. position holds the coins of the player
+        to move and mask the coins of both players
+        """
+        position = 0
+        mask = 0
+        for k in range(rng.randint(0, max_moves)):
+            column = rng.choice(self.legal_columns(mask))
+            move = (mask + self.bottom_mask) & self.column_masks[column]
+            if self.alignment(position | move):
+                break
+            position ^= mask
+            mask |= move
+        return (position, mask)
+
+
+class BitBoard(BitBoardLayout):
+    """A class to represent the connect 4 board as one bitboard per coin
+    type, without the slots and the 2d state kept by Board. It can be used in
+    place of Board wherever nothing has to be drawn"""
+
+    def __init__(self, num_rows, num_columns):
+        """
+        Initialize an empty board with num_rows rows and num_columns columns,
+        laid out as BitBoardLayout describes
+        """
+        BitBoardLayout.__init__(self, num_rows, num_columns)
+        self.total_slots = num_rows * num_columns
+        self.num_slots_filled = 0
+        self.last_value = 0
+
+        # bit index of the lowest empty slot in every column and the index
+        # it reaches once the column is filled
+        self.heights = [j * self.column_height for j in range(num_columns)]
+        self.full_heights = [j * self.column_height + num_rows for j in range(num_columns)]
+        self.available_actions = list(range(num_columns))
+        # bit of every slot, indexed like the rows and columns of Board
+        self.slot_bits = [[1 << (j * self.column_height + num_rows - 1 - i)
+                           for j in range(num_columns)] for i in range(num_rows)]
+
+        # one bitboard per coin type, index 0 is never set
+        self.bitboards = [0, 0, 0]
+        self.last_move_bit = 0
+        self.prev_move = (None, None, None)
+        # columns played so far, in order
+        self.moves = []
+
+    def get_dimensions(self):
+        """
+        Return the dimensions of the board
+        """
+        return (self.num_rows, self.num_columns)
+
+    def check_column_fill(self, col_num):
+        """
+        Return True iff the column col_num on the board is filled up
+        """
+        return self.heights[col_num] == self.full_heights[col_num]
+
+    def determine_row_to_insert(self, col_num):
+        """
+        Determine the row in which the coin can be dropped into
+        """
+        return self.num_rows - 1 - (self.heights[col_num] - col_num * self.column_height)
+
+    def insert_coin(self, coin, background, game_logic):
+        """
+        Insert the coin in the board and update the bitboard of its coin type
+        """
+        col_num = coin.get_column()
+        if not self.check_column_fill(col_num):
+            row_index = self.determine_row_to_insert(col_num)
+            coin_type = coin.get_coin_type()
+            self.last_move_bit = 1 << self.heights[col_num]
+            self.bitboards[coin_type] |= self.last_move_bit
+            self.heights[col_num] += 1
+            if self.heights[col_num] == self.full_heights[col_num]:
+                # replace rather than modify the list, callers may still hold it
+                self.available_actions = [j for j in self.available_actions if j != col_num]
+            self.prev_move = (row_index, col_num, coin_type)
+            self.moves.append(col_num)
+            self.num_slots_filled += 1
+            self.last_value = coin_type
+            coin.drop(background, row_index)
+
+        else:
+            raise ColumnFullException('Column is already filled!')
+
+        PROFILER.start("win")
+        result = game_logic.check_game_over()
+        PROFILER.stop()
+
+        return result
+
+    def check_board_filled(self):
+        """
+        Return true iff the board is completely filled
+        """
+        return (self.total_slots == self.num_slots_filled)
+
+    def check_win(self):
+        """
+        Return True iff the last coin inserted completed a winning sequence,
+        by shifting its bitboard along each of the four directions
+        """
+        return self.alignment(self.bitboards[self.last_value])
+
+    def get_available_actions(self):
+        """
+        Return the available moves. The list is shared between calls and
+        must not be modified
+        """
+        return self.available_actions
+
+    def get_last_filled_information(self):
+        """
+        Return the slot of the last inserted coin and its coin type
+        """
+        (row_index, col_num, value) = self.prev_move
+        return ([(row_index, col_num)], self.last_value)
+
+    def bitboards_to_state(self, first, second):
+        """
+        Return the 2d tuple numerical representation of a pair of bitboards
+        for coin types 1 and 2, laid out like Board.get_state
+        """
+        result = []
+        for row_bits in self.slot_bits:
+            row = []
+            for bit in row_bits:
+                if first & bit:
+                    row.append(1)
+                elif second & bit:
+                    row.append(2)
+                else:
+                    row.append(0)
+            result.append(tuple(row))
+
+        return tuple(result)
+
+    def get_state(self):
+        """
+        Return the 2d tuple numerical representation of the board
+        """
+        return self.bitboards_to_state(self.bitboards[1], self.bitboards[2])
+
+    def get_prev_bitboards(self):
+        """
+        Return the bitboards of coin types 1 and 2 before the last inserted coin
+        """
+        first = self.bitboards[1]
+        second = self.bitboards[2]
+        if self.last_value == 1:
+            first &= ~self.last_move_bit
+        elif self.last_value == 2:
+            second &= ~self.last_move_bit
+        return (first, second)
+
+    def get_prev_state(self):
+        """
+        Return the state of the board before the last inserted coin
+        """
+        (first, second) = self.get_prev_bitboards()
+        return self.bitboards_to_state(first, second)
+
+    def get_state_key(self):
+        """
+        Return the encoded integer key of the state of the board, the same
+        key encode_state computes for get_state
+        """
+        first = self.bitboards[1]
+        return first + (first | self.bitboards[2]) + self.bottom_mask
+
+    def get_prev_state_key(self):
+        """
+        Return the encoded integer key of the state of the board before the
+        last inserted coin
+        """
+        (first, second) = self.get_prev_bitboards()
+        return first + (first | second) + self.bottom_mask
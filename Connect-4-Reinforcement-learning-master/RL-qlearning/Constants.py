@@ -0,0 +1,8 @@
+# colours of the display
+BLUE = (0, 0, 255)
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+# number of rows and columns of the board
+BOARD_SIZE = (6,7)
@@ -0,0 +1,108 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from Board import BitBoardLayout, decode_state_key
+from Constants import BOARD_SIZE
+from Players import Player
+
+
+class DQNPlayer(Player):
+    """A class that represents an AI playing with the network trained in the
+    DQN notebook. The weights exported by its export_weights cell are run
+    forward with NumPy alone, tanh on every hidden layer and a linear output
+    with one value per column"""
+
+    def __init__(self, coin_type, weights="connect_4_model.npz"):
+        """
+        Initialize a DQN player with the weights saved at weights
+        """
+        Player.__init__(self, coin_type)
+        (self.num_rows, self.num_columns) = BOARD_SIZE
+        with np.load(weights) as params:
+            self.layers = []
+            while 'W%d' % len(self.layers) in params:
+                k = len(self.layers)
+                W = params['W%d' % k].astype(np.float32)
+                b = params['b%d' % k].astype(np.float32) if 'b%d' % k in params else np.zeros(W.shape[1], np.float32)
+                self.layers.append((W, b))
+        if not self.layers:
+            raise ValueError('%s holds no DQN weights' % weights)
+        if (self.layers[0][0].shape[0] != self.num_rows * self.num_columns or
+                self.layers[-1][0].shape[1] != self.num_columns):
+            raise ValueError('%s was trained for another board size' % weights)
+
+        # bit of each slot of the notebook's board, whose rows are numbered
+        # from the top and flattened row by row
+        self.slot_bits = np.array([j * (self.num_rows + 1) + (self.num_rows - 1 - i)
+                                   for i in range(self.num_rows) for j in range(self.num_columns)], dtype=np.uint64)
+
+    def to_input(self, state):
+        """
+        Return the encoded state as the network's input, where the coins of
+        this player are 1 and the coins of the opponent 2
+        """
+        (first, mask) = decode_state_key(state, self.num_rows, self.num_columns)
+        own = first if self.coin_type == 1 else first ^ mask
+        filled = (np.uint64(mask) >> self.slot_bits) & np.uint64(1)
+        mine = (np.uint64(own) >> self.slot_bits) & np.uint64(1)
+        return (filled * (np.uint64(2) - mine)).astype(np.float32)
+
+    def predict(self, x):
+        """
+        Return the value of every column for the network input x
+        """
+        for (W, b) in self.layers[:-1]:
+            x = np.tanh(x.dot(W) + b)
+        (W, b) = self.layers[-1]
+        return x.dot(W) + b
+
+    def choose_action(self, state, actions):
+        """
+        Return the available action with the highest value
+        """
+        values = self.predict(self.to_input(state))
+        legal = np.full(self.num_columns, -np.inf, dtype=np.float32)
+        legal[actions] = 0.0
+        return int(np.argmax(values + legal))
+
+    def learn(self, board, actions, action, game_over, game_logic):
+        """
+        The DQN player does not learn from its actions
+        """
+        pass
+
+
+def benchmark(weights, moves=1000, seed=0):
+    """
+    Print how long loading the weights and choosing moves in random
+    positions take
+    """
+    start = time.perf_counter()
+    player = DQNPlayer(1, weights)
+    print("loaded %d layers in %.1fms" % (len(player.layers), 1000.0 * (time.perf_counter() - start)))
+
+    rng = random.Random(seed)
+    layout = BitBoardLayout(BOARD_SIZE[0], BOARD_SIZE[1])
+    states = []
+    for i in range(moves):
+        (position, mask) = layout.random_position(rng, 20)
+        states.append((position + mask + layout.bottom_mask, layout.legal_columns(mask)))
+
+    start = time.perf_counter()
+    for (state, actions) in states:
+        player.choose_action(state, actions)
+    elapsed = time.perf_counter() - start
+    print("%d moves in %.3fs, %.3fms per move" % (moves, elapsed, 1000.0 * elapsed / moves))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('weights', help="Weights file written by the export cell of the DQN notebook")
+    parser.add_argument('--moves', type=int, default=1000, help="Number of random positions to choose a move in")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random positions")
+    args = parser.parse_args()
+
+    benchmark(args.weights, args.moves, args.seed)
@@ -0,0 +1,42 @@
+class GameLogic():
+    """A class that handles win conditions and determines winner"""
+    WIN_SEQUENCE_LENGTH = 4
+
+    def __init__(self, board):
+        """
+        Initialize the GameLogic object with a reference to the game board
+        """
+        self.board = board
+        (num_rows, num_columns) = self.board.get_dimensions()
+        self.board_rows = num_rows
+        self.board_cols = num_columns
+        self.winner_value = 0
+
+    def check_game_over(self):
+        """
+        Check whether the game is over which can be because of a tie or one
+        of two players have won
+        """
+        if self.board.check_win():
+            (last_visited_nodes, self.winner_value) = self.board.get_last_filled_information()
+            return True
+
+        return self.board.check_board_filled()
+
+    def determine_winner_name(self):
+        """
+        Return the winner's name
+        """
+        if (self.winner_value == 1):
+            return "BLUE"
+        elif (self.winner_value == 2):
+            return "RED"
+        else:
+            return "TIE"
+
+    def get_winner(self):
+        """
+        Return the winner coin type value
+        """
+        return self.winner_value
+
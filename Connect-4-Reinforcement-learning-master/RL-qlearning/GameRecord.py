@@ -0,0 +1,386 @@
+import argparse
+import os
+import struct
+import time
+import warnings
+import zlib
+
+
+# magic, format version, rows, columns, creation time in unix seconds
+FILE_HEADER = struct.Struct('<8sIBBQ')
+FILE_MAGIC = b'C4GAMES\x00'
+FILE_VERSION = 2
+# CRC32 of the length and the bytes of a record, written after the record
+RECORD_CRC = struct.Struct('<I')
+# a record claiming to be longer than this is taken for corruption, a frame
+# is a record along with its length, at most 2 bytes, and its CRC
+MAX_RECORD_SIZE = 1 << 12
+MAX_FRAME_SIZE = 2 + MAX_RECORD_SIZE + RECORD_CRC.size
+
+# where the game was played, kept in the flags of every record
+KINDS = ["unknown", "two_player", "single", "train", "headless"]
+
+# outcome bits of the flags of a game that was abandoned before its end
+UNFINISHED = 3
+# flag bits above the outcome
+FIRST_IS_TWO = 1 << 2
+HAS_MOVE_TIMES = 1 << 3
+KIND_SHIFT = 4
+
+# bytes read from the file at a time
+READ_SIZE = 1 << 20
+
+
+def encode_varint(value):
+    """
+    Return a non-negative integer as little endian groups of 7 bits, the
+    high bit of every byte but the last one set
+    """
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+def decode_varint(data, pos):
+    """
+    Return the integer starting at pos in data and the position after it,
+    or None if data ends first
+    """
+    value = 0
+    shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return (value, pos)
+        shift += 7
+    return None
+
+
+def encode_game(first_coin_type, moves, winner, start, duration, move_times=None, kind="unknown", epoch=0):
+    """
+    Return the record of a game, without its frame. It is one flags byte
+    holding the outcome, the first player, the kind and whether move times
+    follow, then varints of the number of moves, the start in seconds after
+    epoch and the duration in milliseconds, the columns packed 3 bits per
+    move from the lowest bit up and, optionally, the milliseconds every move
+    took as varints
+    """
+    flags = UNFINISHED if winner is None else winner
+    if first_coin_type == 2:
+        flags |= FIRST_IS_TWO
+    if move_times is not None:
+        flags |= HAS_MOVE_TIMES
+    flags |= KINDS.index(kind) << KIND_SHIFT
+
+    packed = 0
+    for (i, column) in enumerate(moves):
+        packed |= column << (3 * i)
+
+    out = bytearray([flags])
+    out += encode_varint(len(moves))
+    out += encode_varint(max(0, int(start) - epoch))
+    out += encode_varint(int(round(1000 * duration)))
+    out += packed.to_bytes((3 * len(moves) + 7) // 8, 'little')
+    if move_times is not None:
+        for seconds in move_times:
+            out += encode_varint(int(round(1000 * seconds)))
+    return out
+
+
+def encode_frame(record):
+    """
+    Return a record preceded by its length and followed by the CRC32 of
+    both, which lets a reader tell a damaged record from a valid one and
+    find the next valid record after it
+    """
+    head = encode_varint(len(record)) + record
+    return head + RECORD_CRC.pack(zlib.crc32(head))
+
+
+class CorruptRecord(Exception):
+    """An exception that will be thrown for bytes of a game log that are not
+    a valid record"""
+    pass
+
+
+class GameRecord():
+    """A class that represents a recorded game"""
+
+    def __init__(self, first_coin_type, moves, winner, start, duration, move_times, kind):
+        """
+        Initialize a game where first_coin_type moved first and moves are
+        the columns played. winner is the winning coin type, 0 for a tie and
+        None for an abandoned game, start is in unix seconds and duration and
+        move_times, None unless they were recorded, are in seconds
+        """
+        self.first_coin_type = first_coin_type
+        self.moves = moves
+        self.winner = winner
+        self.start = start
+        self.duration = duration
+        self.move_times = move_times
+        self.kind = kind
+
+    def coin_types(self):
+        """
+        Return the coin type that played every move
+        """
+        second_coin_type = 2 if self.first_coin_type == 1 else 1
+        return [self.first_coin_type if i % 2 == 0 else second_coin_type for i in range(len(self.moves))]
+
+
+def decode_game(data, pos, epoch):
+    """
+    Return the game whose record starts at pos in data and the position
+    after it, or None if data ends first
+    """
+    if pos >= len(data):
+        return None
+    flags = data[pos]
+    decoded = decode_varint(data, pos + 1)
+    if decoded is None:
+        return None
+    (count, pos) = decoded
+    decoded = decode_varint(data, pos)
+    if decoded is None:
+        return None
+    (start, pos) = decoded
+    decoded = decode_varint(data, pos)
+    if decoded is None:
+        return None
+    (duration, pos) = decoded
+    end = pos + (3 * count + 7) // 8
+    if end > len(data):
+        return None
+    packed = int.from_bytes(data[pos:end], 'little')
+    moves = [(packed >> (3 * i)) & 7 for i in range(count)]
+    pos = end
+
+    move_times = None
+    if flags & HAS_MOVE_TIMES:
+        move_times = []
+        for i in range(count):
+            decoded = decode_varint(data, pos)
+            if decoded is None:
+                return None
+            (milliseconds, pos) = decoded
+            move_times.append(milliseconds / 1000.0)
+
+    outcome = flags & 3
+    game = GameRecord(2 if flags & FIRST_IS_TWO else 1, moves, None if outcome == UNFINISHED else outcome,
+                      epoch + start, duration / 1000.0, move_times, KINDS[flags >> KIND_SHIFT])
+    return (game, pos)
+
+
+def decode_frame(data, pos, epoch):
+    """
+    Return the game framed at pos in data and the position after its frame,
+    or None if data ends first. Raises CorruptRecord if the bytes at pos are
+    not a valid frame
+    """
+    head = data[pos:pos + 3]
+    decoded = decode_varint(head, 0)
+    if decoded is None:
+        if len(head) == 3:
+            raise CorruptRecord()
+        return None
+    (length, size) = decoded
+    if length > MAX_RECORD_SIZE:
+        raise CorruptRecord()
+    start = pos + size
+    end = start + length + RECORD_CRC.size
+    if end > len(data):
+        return None
+    (crc,) = RECORD_CRC.unpack_from(data, start + length)
+    if crc != zlib.crc32(data[pos:start + length]) or length == 0 or data[start] >> KIND_SHIFT >= len(KINDS):
+        raise CorruptRecord()
+    decoded = decode_game(data[start:start + length], 0, epoch)
+    if decoded is None or decoded[1] != length:
+        raise CorruptRecord()
+    return (decoded[0], end)
+
+
+def scan_log(f, epoch):
+    """
+    Yield the (game, start, end) of every record of the log open in f from
+    its position on, start and end being file offsets. Every run of bytes
+    between two records that are not a valid one, such as a record cut
+    short by a crash, is yielded as (None, start, end) and scanning goes on
+    with the next valid record
+    """
+    data = b''
+    pos = 0
+    offset = f.tell()
+    at_end = False
+    corrupt_start = None
+    while True:
+        if not at_end and len(data) - pos < MAX_FRAME_SIZE:
+            block = f.read(READ_SIZE)
+            at_end = not block
+            offset += pos
+            data = data[pos:] + block
+            pos = 0
+        if pos >= len(data):
+            break
+        try:
+            decoded = decode_frame(data, pos, epoch)
+        except CorruptRecord:
+            decoded = False
+        if decoded is None and not at_end:
+            continue
+        if not decoded:
+            # look for the next record one byte further
+            if corrupt_start is None:
+                corrupt_start = offset + pos
+            pos += 1
+            continue
+        if corrupt_start is not None:
+            yield (None, corrupt_start, offset + pos)
+            corrupt_start = None
+        (game, end) = decoded
+        yield (game, offset + pos, offset + end)
+        pos = end
+    if corrupt_start is not None:
+        yield (None, corrupt_start, offset + len(data))
+
+
+def ends_with_record(data, epoch):
+    """
+    Return True iff the last bytes of data are a valid frame
+    """
+    for pos in range(len(data)):
+        try:
+            decoded = decode_frame(data, pos, epoch)
+        except CorruptRecord:
+            continue
+        if decoded is not None and decoded[1] == len(data):
+            return True
+    return False
+
+
+def read_header(f, path):
+    """
+    Return the (rows, columns, epoch) of the log open in f
+    """
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise ValueError('%s is not a game log' % path)
+    (magic, version, num_rows, num_columns, epoch) = FILE_HEADER.unpack(header)
+    if magic != FILE_MAGIC or version != FILE_VERSION:
+        raise ValueError('%s is not a game log' % path)
+    return (num_rows, num_columns, epoch)
+
+
+class GameRecorder():
+    """A class that appends finished games to a binary log. The log is a
+    header followed by one framed record per game, written with a single
+    call so that several processes can append to the same file, and a game
+    costs a few bytes plus 3 bits per move"""
+
+    def __init__(self, path, num_rows, num_columns, repair=True):
+        """
+        Open the log at path for appending, creating it for boards of
+        num_rows by num_columns if it does not exist. With repair a record
+        left incomplete at the end of the log is removed first, which only
+        the first of several processes sharing the log should do
+        """
+        if num_columns > 7:
+            raise ValueError('a game log packs columns in 3 bits, %d columns do not fit' % num_columns)
+        self.path = path
+        self.file = open(path, 'ab+', buffering=0)
+        self.file.seek(0)
+        if self.file.read(1):
+            self.file.seek(0)
+            (rows, columns, self.epoch) = read_header(self.file, path)
+            if (rows, columns) != (num_rows, num_columns):
+                self.file.close()
+                raise ValueError('%s records games on a %dx%d board' % (path, rows, columns))
+            if repair:
+                self.repair()
+        else:
+            self.epoch = int(time.time())
+            self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, num_rows, num_columns, self.epoch))
+        self.games = 0
+
+    def record(self, first_coin_type, moves, winner, start, duration, move_times=None, kind="unknown"):
+        """
+        Append a game, see GameRecord for the meaning of the arguments
+        """
+        self.file.write(encode_frame(encode_game(first_coin_type, moves, winner, start, duration, move_times, kind, self.epoch)))
+        self.games += 1
+
+    def repair(self):
+        """
+        Truncate whatever follows the last valid record of the log, such as
+        a record cut short by a writer that crashed, so that new records are
+        not appended to it. Only the end of the log is read unless it is
+        damaged
+        """
+        size = os.fstat(self.file.fileno()).st_size
+        self.file.seek(max(FILE_HEADER.size, size - MAX_FRAME_SIZE))
+        tail = self.file.read()
+        if not tail or ends_with_record(tail, self.epoch):
+            return
+        self.file.seek(FILE_HEADER.size)
+        valid_end = FILE_HEADER.size
+        for (game, start, end) in scan_log(self.file, self.epoch):
+            if game is not None:
+                valid_end = end
+        os.ftruncate(self.file.fileno(), valid_end)
+        warnings.warn('%s: truncated %d bytes after the last valid record' % (self.path, size - valid_end))
+
+    def close(self):
+        """
+        Close the log
+        """
+        self.file.close()
+
+
+def read_games(path):
+    """
+    Yield every game of the log at path in the order it was recorded,
+    reading the file a block at a time. Bytes that are not a valid record,
+    such as a record cut short by a crash, are skipped with a warning giving
+    their offset and reading goes on with the next valid record
+    """
+    with open(path, 'rb') as f:
+        (num_rows, num_columns, epoch) = read_header(f, path)
+        for (game, start, end) in scan_log(f, epoch):
+            if game is None:
+                warnings.warn('%s: skipped %d corrupt bytes at offset %d' % (path, end - start, start))
+            else:
+                yield game
+
+
+def summarize(path):
+    """
+    Print the number of games, moves and bytes of the log at path and how
+    the games ended
+    """
+    start = time.perf_counter()
+    games = 0
+    moves = 0
+    outcomes = {}
+    for game in read_games(path):
+        games += 1
+        moves += len(game.moves)
+        outcome = "abandoned" if game.winner is None else ("tie" if game.winner == 0 else "coin %d won" % game.winner)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    print("%d games, %d moves, %d bytes (%.1f bytes per game), read in %.2fs" % (
+        games, moves, size, float(size - FILE_HEADER.size) / games if games else 0.0, elapsed))
+    for (outcome, count) in sorted(outcomes.items()):
+        print("%-12s %d" % (outcome, count))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a game log written by GameRecorder")
+    parser.add_argument('path', help="Game log file")
+    args = parser.parse_args()
+    summarize(args.path)
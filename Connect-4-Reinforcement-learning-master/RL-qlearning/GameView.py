@@ -1,36 +1,33 @@
 import pygame
 import random
-import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
-
-# define some global variables
-BLUE = (0, 0, 255)
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BOARD_SIZE = (7,6)
-
-class ColumnFullException(Exception):
-    """An exception that will be thrown if a column of the board is full"""
-    def __init__(self, value):
-        self.value = value
-
-    def __str__(self):
-        return repr(self.value)
+from Board import Board, ColumnFullException
+from Coin import Coin
+from Constants import BLACK, BOARD_SIZE, GREEN, WHITE
+from GameLogic import GameLogic
+from Players import HumanPlayer, ComputerPlayer
+from Profiler import PROFILER
+from Slot import Slot
+from Sprites import SPRITES
 
 
 class GameView(object):
     """A class that represents the displays in the game"""
 
-    def __init__(self, width=640, height=400, fps=30):
-        """Initialize pygame, window, background, font,...
+    def __init__(self, width=640, height=400, fps=30, computer_type="qlearner", computer_options=None, recorder=None):
+        """Initialize pygame, window, background, font,... computer_type is
+        the kind of AI played against in single player mode and every game
+        is appended to the GameRecorder recorder if there is one
         """
         pygame.init()
         pygame.display.set_caption("Press ESC to quit")
         self.width = width
         self.height = height
         self.screen = pygame.display.set_mode((self.width, self.height), pygame.DOUBLEBUF)
+        # cached sprites are converted to the format of the old display
+        SPRITES.clear()
         self.background = pygame.Surface(self.screen.get_size()).convert()
         self.clock = pygame.time.Clock()
         self.fps = fps
@@ -38,6 +35,34 @@ class GameView(object):
         self.font = pygame.font.SysFont('mono', 20, bold=True)
         self.trainedComputer = None
         self.win_list = [0,0]
+        self.computer_type = computer_type
+        self.computer_options = computer_options or {}
+        self.recorder = recorder
+        # computer moves are chosen on a worker thread so that the frame loop
+        # keeps handling events and drawing while the computer thinks
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_move = None
+        # regions of the background that changed since the screen was updated
+        self.dirty_rects = []
+
+    def mark_dirty(self, rects):
+        """
+        Remember regions of the background that have to be copied to the
+        screen on the next update
+        """
+        self.dirty_rects.extend(rects)
+
+    def update_display(self):
+        """
+        Copy the changed regions of the background to the screen and push
+        only those to the display, nothing is done if none changed
+        """
+        if not self.dirty_rects:
+            return
+        for rect in self.dirty_rects:
+            self.screen.blit(self.background, rect, rect)
+        pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
 
     def initialize_game_variables(self, game_mode):
         """
@@ -52,7 +77,7 @@ class GameView(object):
         if game_mode == "single":
             self.p1 = HumanPlayer(first_coin_type)
             if (self.trainedComputer == None):
-                self.p2 = ComputerPlayer(second_coin_type, "qlearner")
+                self.p2 = ComputerPlayer(second_coin_type, self.computer_type, **self.computer_options)
                 self.trainedComputer = self.p2
             else:
                 self.trainedComputer.set_coin_type(second_coin_type)
@@ -75,6 +100,7 @@ class GameView(object):
         play_game = False
         self.background.fill(WHITE)
         self.draw_menu()
+        self.mark_dirty([self.background.get_rect()])
 
         while main_menu:
             for event in pygame.event.get():
@@ -105,10 +131,10 @@ class GameView(object):
 
             milliseconds = self.clock.tick(self.fps)
             self.playtime += milliseconds / 1000.0
-            pygame.display.flip()
-            self.screen.blit(self.background, (0, 0))
+            self.update_display()
 
         if not play_game:
+            self.executor.shutdown(wait=False)
             pygame.quit()
 
         elif game_mode == "train":
@@ -123,9 +149,13 @@ class GameView(object):
         Main loop in the game
         """
         while (iterations > 0):
+            PROFILER.start_game()
             self.initialize_game_variables(game_mode)
+            PROFILER.start("render")
             self.background.fill(BLACK)
             self.game_board.draw(self.background)
+            self.mark_dirty([self.background.get_rect()])
+            PROFILER.stop()
             game_over = False
             turn_ended = False
             uninitialized = True
@@ -140,6 +170,10 @@ class GameView(object):
                 human_turn = False
 
             p1_turn = (self.p1.get_coin_type() == current_type)
+            first_mover = current_type
+            start = time.time()
+            game_start = move_start = time.perf_counter()
+            move_times = []
 
             (first_slot_X, first_slot_Y) = self.game_board.get_slot(0,0).get_position()
             coin = Coin(current_type)
@@ -152,15 +186,33 @@ class GameView(object):
                     coin.set_column(0)
                     uninitialized = False
                     coin_inserted = False
-
-                coin.draw(self.background)
+                    PROFILER.start("render")
+                    self.mark_dirty([coin.draw(self.background)])
+                    PROFILER.stop()
 
                 current_player = self.p1 if p1_turn else self.p2
 
                 if not human_turn:
-                    game_over = current_player.complete_move(coin, self.game_board, self.game_logic, self.background)
-                    coin_inserted = True
-                    uninitialized = True
+                    if self.pending_move is None:
+                        actions = self.game_board.get_available_actions()
+                        # the move is chosen on the executor's thread, which the game's cProfile does not see
+                        future = self.executor.submit(PROFILER.call, current_player.choose_next_action,
+                                                      self.game_board.get_state_key(), actions)
+                        self.pending_move = (actions, future)
+                    (actions, future) = self.pending_move
+                    # wait at most a frame, the clock below then has nothing left to wait
+                    PROFILER.start("choose")
+                    wait([future], timeout=1.0 / self.fps)
+                    PROFILER.stop()
+                    if future.done():
+                        self.pending_move = None
+                        # the coin only shows up where it starts and where it lands
+                        self.mark_dirty([coin.get_rect()])
+                        game_over = current_player.finish_move(coin, self.game_board, self.game_logic, self.background,
+                                                               actions, future.result())
+                        self.mark_dirty([coin.get_rect()])
+                        coin_inserted = True
+                        uninitialized = True
 
                 # handle the keyboard events
                 for event in pygame.event.get():
@@ -171,21 +223,25 @@ class GameView(object):
                             game_over = True
                         if event.key == pygame.K_RIGHT and human_turn:
                             if (coin.get_column() + 1 < self.board_cols):
-                                coin.move_right(self.background)
+                                self.mark_dirty(coin.move_right(self.background))
 
                         elif event.key == pygame.K_LEFT and human_turn:
                             if (coin.get_column() - 1 >= 0):
-                                coin.move_left(self.background)
+                                self.mark_dirty(coin.move_left(self.background))
 
                         elif event.key == pygame.K_RETURN and human_turn and not coin_inserted:
                             try:
+                                self.mark_dirty([coin.get_rect()])
+                                PROFILER.start("board")
                                 game_over = self.game_board.insert_coin(coin, self.background, self.game_logic)
+                                PROFILER.stop()
+                                self.mark_dirty([coin.get_rect()])
                                 current_player.complete_move()
                                 uninitialized = True
                                 coin_inserted = True
 
                             except ColumnFullException as e:
-                                pass
+                                PROFILER.stop()
 
                 if game_over:
                     winner = self.game_logic.determine_winner_name()
@@ -195,17 +251,35 @@ class GameView(object):
                     game_over_screen = True
 
                 if coin_inserted:
+                    now = time.perf_counter()
+                    move_times.append(now - move_start)
+                    move_start = now
                     if game_mode == "single":
                         human_turn = not human_turn
                     current_type = 1 if current_type == 2 else 2
                     p1_turn = not p1_turn
 
 
+                PROFILER.start("wait")
                 milliseconds = self.clock.tick(self.fps)
+                PROFILER.stop()
                 self.playtime += milliseconds / 1000.0
-                pygame.display.flip()
-                self.screen.blit(self.background, (0, 0))
-
+                PROFILER.start("render")
+                self.update_display()
+                PROFILER.stop()
+
+            if self.pending_move is not None:
+                # the game was quit while the computer was thinking
+                current_player.stop()
+                self.pending_move[1].cancel()
+                self.pending_move = None
+            if self.recorder is not None:
+                # a game quit before its end has neither a winner nor a full board
+                finished = self.game_logic.get_winner() > 0 or self.game_board.check_board_filled()
+                self.recorder.record(first_mover, self.game_board.moves,
+                                     self.game_logic.get_winner() if finished else None,
+                                     start, time.perf_counter() - game_start, move_times, game_mode)
+            PROFILER.end_game()
             iterations -= 1
 
         if game_mode == "train":
@@ -258,6 +332,7 @@ class GameView(object):
         main_menu = False
         self.background.fill(WHITE)
         self.draw_game_over(winner)
+        self.mark_dirty([self.background.get_rect()])
 
         while game_over_screen:
             for event in pygame.event.get():
@@ -276,10 +351,10 @@ class GameView(object):
 
             milliseconds = self.clock.tick(self.fps)
             self.playtime += milliseconds / 1000.0
-            pygame.display.flip()
-            self.screen.blit(self.background, (0, 0))
+            self.update_display()
 
         if not main_menu:
+            self.executor.shutdown(wait=False)
             pygame.quit()
 
         else:
@@ -0,0 +1,225 @@
+import argparse
+import math
+import random
+import time
+
+from Board import BitBoardLayout, decode_state_key
+from Constants import BOARD_SIZE
+from Players import Player
+
+
+class MCTSNode():
+    """A class that represents a position in the search tree of MCTSPlayer"""
+
+    def __init__(self, position, mask, moves, parent=None, column=None, won=False):
+        """
+        Initialize a node for the position where position holds the coins of
+        the player to move and mask the coins of both players. column is the
+        move that led to it and won is True iff that move won the game
+        """
+        self.position = position
+        self.mask = mask
+        self.moves = moves
+        self.parent = parent
+        self.column = column
+        self.won = won
+        self.children = []
+        # legal moves that have no child yet, filled in on the first visit
+        self.untried = None
+        self.visits = 0
+        # results for the player who made the move into this node
+        self.wins = 0.0
+
+
+class MCTSPlayer(Player):
+    """A class that represents an AI using Monte Carlo Tree Search with UCT
+    selection and random playouts on bitboards laid out like BitBoard"""
+
+    # number of simulations between two looks at the clock
+    CLOCK_INTERVAL = 64
+
+    def __init__(self, coin_type, time_budget=0.5, simulations=None, exploration=1.4):
+        """
+        Initialize an MCTS player that runs simulations until it has spent
+        time_budget seconds on a move or, if given, ran simulations of them
+        """
+        Player.__init__(self, coin_type)
+        (self.num_rows, self.num_columns) = BOARD_SIZE
+        self.total_slots = self.num_rows * self.num_columns
+        self.time_budget = time_budget
+        self.simulations = simulations
+        self.exploration = exploration
+        self.layout = BitBoardLayout(self.num_rows, self.num_columns)
+        # kept on the player as well, the playouts read them at every move
+        self.column_masks = self.layout.column_masks
+        self.bottom_mask = self.layout.bottom_mask
+        self.board_mask = self.layout.board_mask
+        self.alignment = self.layout.alignment
+        # the tree below the last move played, kept for the next move
+        self.root = None
+        self.playouts = 0
+        self.search_time = 0.0
+        # set from another thread to end the search early
+        self.stopped = False
+
+    def choose_action(self, state, actions):
+        """
+        Return the most simulated action for the encoded state
+        """
+        (first, mask) = decode_state_key(state, self.num_rows, self.num_columns)
+        position = first if self.coin_type == 1 else first ^ mask
+        column = self.search(position, mask)
+        if column not in actions:
+            return random.choice(actions)
+        return column
+
+    def learn(self, board, actions, action, game_over, game_logic):
+        """
+        The MCTS player does not learn from its actions
+        """
+        pass
+
+    def playout(self, position, mask, moves):
+        """
+        Play random moves from a position until the game ends and return the
+        result for the player to move: 1 for a win, 0.5 for a tie and 0 for
+        a loss. Nothing is allocated besides the integers of the bitboards
+        """
+        column_masks = self.column_masks
+        num_columns = self.num_columns
+        randrange = random.randrange
+        result = 1.0
+        while moves < self.total_slots:
+            possible = (mask + self.bottom_mask) & self.board_mask
+            move = possible & column_masks[randrange(num_columns)]
+            while not move:
+                move = possible & column_masks[randrange(num_columns)]
+            if self.alignment(position | move):
+                return result
+            position ^= mask
+            mask |= move
+            moves += 1
+            result = 1.0 - result
+        return 0.5
+
+    def expand(self, node):
+        """
+        Add a child for one of the untried moves of node and return it
+        """
+        if node.untried is None:
+            node.untried = self.layout.legal_columns(node.mask)
+            random.shuffle(node.untried)
+        column = node.untried.pop()
+        move = ((node.mask + self.bottom_mask) & self.column_masks[column])
+        child = MCTSNode(node.position ^ node.mask, node.mask | move, node.moves + 1, node, column,
+                         self.alignment(node.position | move))
+        node.children.append(child)
+        return child
+
+    def select(self, node):
+        """
+        Return the child of node with the highest upper confidence bound
+        """
+        log_visits = math.log(node.visits)
+        best = None
+        best_value = -1.0
+        for child in node.children:
+            value = child.wins / child.visits + self.exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+    def simulate(self, root):
+        """
+        Run one simulation from root: select down the tree, expand a node,
+        play it out and update the results of every node on the way
+        """
+        node = root
+        while not node.won and node.moves < self.total_slots and node.untried == []:
+            node = self.select(node)
+        if not node.won and node.moves < self.total_slots:
+            node = self.expand(node)
+
+        if node.won:
+            result = 1.0
+        elif node.moves == self.total_slots:
+            result = 0.5
+        else:
+            result = 1.0 - self.playout(node.position, node.mask, node.moves)
+
+        while node is not None:
+            node.visits += 1
+            node.wins += result
+            result = 1.0 - result
+            node = node.parent
+
+    def find_root(self, position, mask):
+        """
+        Return the node of the kept tree for the position, or a new node if
+        the position is not in it
+        """
+        if self.root is not None:
+            for child in self.root.children:
+                if child.position == position and child.mask == mask:
+                    child.parent = None
+                    return child
+        return MCTSNode(position, mask, bin(mask).count("1"))
+
+    def search(self, position, mask):
+        """
+        Return the column with the most simulations from the position and
+        keep its subtree for the next search
+        """
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        root = self.find_root(position, mask)
+        self.playouts = 0
+        while True:
+            self.simulate(root)
+            self.playouts += 1
+            if self.simulations is not None and self.playouts >= self.simulations:
+                break
+            if self.playouts % MCTSPlayer.CLOCK_INTERVAL == 0 and (self.stopped or time.perf_counter() > deadline):
+                break
+
+        best = root.children[0]
+        for child in root.children:
+            if child.visits > best.visits:
+                best = child
+        best.parent = None
+        self.root = best
+        self.search_time = time.perf_counter() - start
+        return best.column
+
+
+def benchmark(time_budget=1.0, positions=10, seed=0):
+    """
+    Run simulations from random positions for time_budget seconds each and
+    print the playouts per second for every position
+    """
+    random.seed(seed)
+    player = MCTSPlayer(1, time_budget)
+    total_playouts = 0
+    total_time = 0.0
+    print("%8s %6s %10s %12s" % ("position", "coins", "playouts", "playouts/s"))
+    for i in range(positions):
+        # play a few random moves that do not end the game
+        (position, mask) = player.layout.random_position(random, 8)
+        player.root = None
+        player.search(position, mask)
+        total_playouts += player.playouts
+        total_time += player.search_time
+        print("%8d %6d %10d %12.0f" % (i, bin(mask).count("1"), player.playouts,
+                                       player.playouts / player.search_time))
+    print("total: %d playouts in %.2fs, %.0f playouts/s" % (total_playouts, total_time, total_playouts / total_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--time', type=float, default=1.0, help="Seconds to search each position for")
+    parser.add_argument('--positions', type=int, default=10, help="Number of random positions to search")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random positions")
+    args = parser.parse_args()
+
+    benchmark(args.time, args.positions, args.seed)
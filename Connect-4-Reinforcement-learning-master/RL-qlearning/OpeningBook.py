@@ -0,0 +1,148 @@
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from Board import BitBoardLayout, decode_state_key
+from Constants import BOARD_SIZE
+from SearchPlayer import SearchPlayer
+
+
+# magic, format version, number of rows, number of columns, number of positions
+FILE_HEADER = struct.Struct('<8sIIIxxxxQ')
+FILE_MAGIC = b'C4OPENBK'
+FILE_VERSION = 1
+
+
+class OpeningBook():
+    """A class that looks up the best moves of early positions in a book
+    file written by generate_book. The positions are keyed by the coins of
+    the player to move plus the encode_state marker bits, so one entry
+    serves either coin type, and the file is memory-mapped, not read"""
+
+    def __init__(self, path):
+        """
+        Map the opening book saved at path
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                raise ValueError('%s is not an opening book file' % path)
+            (magic, version, num_rows, num_columns, count) = FILE_HEADER.unpack(header)
+            if magic != FILE_MAGIC or version != FILE_VERSION:
+                raise ValueError('%s is not an opening book file' % path)
+            self.file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+        self.count = count
+        self.bottom_mask = BitBoardLayout(num_rows, num_columns).bottom_mask
+        keys_start = FILE_HEADER.size
+        moves_start = keys_start + 8 * count
+        if len(self.file_map) < moves_start + count:
+            self.file_map.close()
+            raise ValueError('%s is truncated' % path)
+
+        view = memoryview(self.file_map)
+        if sys.byteorder == 'little':
+            self.keys = view[keys_start:moves_start].cast('Q')
+        else:
+            # the file is little endian, so big endian machines need a copy
+            self.keys = array('Q', view[keys_start:moves_start].tobytes())
+            self.keys.byteswap()
+        self.moves = view[moves_start:moves_start + count]
+        view.release()
+
+    def __len__(self):
+        """
+        Return the number of positions in the book
+        """
+        return self.count
+
+    def lookup(self, key):
+        """
+        Return the best move stored for a key relative to the player to move
+        or None if the position is not in the book
+        """
+        i = bisect.bisect_left(self.keys, key)
+        if i < self.count and self.keys[i] == key:
+            return self.moves[i]
+        return None
+
+    def get_action(self, state, coin_type):
+        """
+        Return the best move for the player of coin_type in the encoded
+        state or None if the position is not in the book
+        """
+        if (self.num_rows, self.num_columns) != BOARD_SIZE:
+            return None
+        if coin_type == 1:
+            # encode_state keys already hold the coins of type 1
+            return self.lookup(state)
+        (first, mask) = decode_state_key(state, self.num_rows, self.num_columns)
+        return self.lookup((first ^ mask) + mask + self.bottom_mask)
+
+    def close(self):
+        """
+        Unmap the file
+        """
+        if isinstance(self.keys, memoryview):
+            self.keys.release()
+        self.moves.release()
+        self.file_map.close()
+
+
+def generate_book(path, depth=4, time_budget=0.1, max_depth=None):
+    """
+    Search every position reachable within depth moves of the empty board,
+    giving each one time_budget seconds and at most max_depth moves of
+    lookahead, and write the best moves to a book file at path
+    """
+    searcher = SearchPlayer(1, time_budget, max_depth)
+    (num_rows, num_columns) = BOARD_SIZE
+    entries = {}
+    frontier = {(0, 0)}
+    start = time.perf_counter()
+    for ply in range(depth + 1):
+        next_frontier = set()
+        for (position, mask) in frontier:
+            entries[position + mask + searcher.bottom_mask] = searcher.search(position, mask)
+            if ply == depth:
+                continue
+            possible = (mask + searcher.bottom_mask) & searcher.board_mask
+            for j in range(num_columns):
+                move = possible & searcher.column_masks[j]
+                # positions after a winning move are over
+                if move and not searcher.winning_slots(position, mask) & move:
+                    next_frontier.add((position ^ mask, mask | move))
+        print("ply %d: %d positions, %.1fs" % (ply, len(frontier), time.perf_counter() - start))
+        frontier = next_frontier
+
+    keys = array('Q', sorted(entries))
+    moves = array('B', [entries[key] for key in keys])
+    if sys.byteorder == 'big':
+        keys.byteswap()
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, num_rows, num_columns, len(keys)))
+        keys.tofile(f)
+        moves.tofile(f)
+    os.replace(temp_path, path)
+    return len(keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help="File to write the opening book to")
+    parser.add_argument('--depth', type=int, default=4, help="Number of moves from the empty board the book covers")
+    parser.add_argument('--time', type=float, default=0.1, help="Seconds to search each position for")
+    parser.add_argument('--max-depth', type=int, default=None, help="Maximum number of moves to search ahead")
+    args = parser.parse_args()
+
+    count = generate_book(args.path, args.depth, args.time, args.max_depth)
+    print("Wrote %d positions to %s" % (count, args.path))
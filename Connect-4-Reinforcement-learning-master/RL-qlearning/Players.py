@@ -1,22 +1,7 @@
-import pygame
 import random
-import argparse
 
-# define some global variables
-BLUE = (0, 0, 255)
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BOARD_SIZE = (7,6)
+from Profiler import PROFILER
 
-class ColumnFullException(Exception):
-    """An exception that will be thrown if a column of the board is full"""
-    def __init__(self, value):
-        self.value = value
-
-    def __str__(self):
-        return repr(self.value)
 
 class Player():
     """A class that represents a player in the game"""
@@ -59,28 +44,61 @@ class HumanPlayer(Player):
 class ComputerPlayer(Player):
             """A class that represents an AI player in the game"""
 
-            def __init__(self, coin_type, player_type):
+            def __init__(self, coin_type, player_type, opening_book=None, **options):
                 """
-                Initialize an AI with the proper type which are one of Random and
-                Q-learner currently
+                Initialize an AI with the proper type which are one of Random,
+                Search, MCTS, DQN and Q-learner currently, any options are passed on
+                to the chosen player. The moves of an OpeningBook, if given, are
+                played before asking the player
                 """
+                self.opening_book = opening_book
                 if (player_type == "random"):
                     self.player = RandomPlayer(coin_type)
+                elif (player_type == "search"):
+                    from SearchPlayer import SearchPlayer
+                    self.player = SearchPlayer(coin_type, **options)
+                elif (player_type == "mcts"):
+                    from MCTSPlayer import MCTSPlayer
+                    self.player = MCTSPlayer(coin_type, **options)
+                elif (player_type == "dqn"):
+                    from DQNPlayer import DQNPlayer
+                    self.player = DQNPlayer(coin_type, **options)
                 else:
-                    self.player = QLearningPlayer(coin_type)
+                    from QLearningPlayer import QLearningPlayer
+                    self.player = QLearningPlayer(coin_type, **options)
 
             def complete_move(self, coin, board, game_logic, background):
                 """
                 Move the coin and decide which slot to drop it in and learn from the
                 chosen move
                 """
+                PROFILER.start("choose")
                 actions = board.get_available_actions()
-                state = board.get_state()
+                state = board.get_state_key()
                 chosen_action = self.choose_action(state, actions)
-                coin.move_right(background, chosen_action)
+                PROFILER.stop()
+                return self.finish_move(coin, board, game_logic, background, actions, chosen_action)
+
+            def finish_move(self, coin, board, game_logic, background, actions, chosen_action):
+                """
+                Drop the coin in the chosen column, one of the actions that were
+                available, and learn from the move. choose_action may run on
+                another thread but the board is only changed here
+                """
+                if background is None:
+                    # a headless coin is never drawn
+                    coin.move_right(background, chosen_action)
+                else:
+                    PROFILER.start("render")
+                    coin.move_right(background, chosen_action)
+                    PROFILER.stop()
                 coin.set_column(chosen_action)
+                PROFILER.start("board")
                 game_over = board.insert_coin(coin, background, game_logic)
+                PROFILER.stop()
+                PROFILER.start("learn")
                 self.player.learn(board, actions, chosen_action, game_over, game_logic)
+                PROFILER.stop()
 
                 return game_over
 
@@ -90,13 +108,53 @@ class ComputerPlayer(Player):
                 """
                 return self.player.get_coin_type()
 
+            def set_coin_type(self, coin_type):
+                """
+                Set the coin type of the AI player
+                """
+                self.player.set_coin_type(coin_type)
+
             def choose_action(self, state, actions):
                 """
                 Choose an action (which slot to drop in) based on the state of the
                 board
                 """
+                if self.opening_book is not None:
+                    action = self.opening_book.get_action(state, self.get_coin_type())
+                    if action in actions:
+                        return action
                 return self.player.choose_action(state, actions)
 
+            def choose_next_action(self, state, actions):
+                """
+                Let the player think again and choose an action. Meant to be
+                submitted to the thread that runs choose_action, where it only
+                starts once a stopped choose_action before it has returned
+                """
+                self.stop(False)
+                return self.choose_action(state, actions)
+
+            def stop(self, stopped=True):
+                """
+                Ask a choose_action running on another thread to return as soon
+                as it can, or with stopped False let the next one think again.
+                Players that search until a deadline check for it, the others
+                return quickly anyway
+                """
+                self.player.stopped = stopped
+
+            def save(self, path):
+                """
+                Save what the AI player has learned to a file
+                """
+                self.player.save(path)
+
+            def load(self, path):
+                """
+                Load what the AI player has learned from a file
+                """
+                self.player.load(path)
+
 class RandomPlayer(Player):
             """A class that represents a computer that selects random moves based on the moves available"""
 
@@ -112,7 +170,7 @@ class RandomPlayer(Player):
                 """
                 return random.choice(actions)
 
-            def learn(self, board, action, game_over, game_logic):
+            def learn(self, board, actions, action, game_over, game_logic):
                 """
                 The random player does not learn from its actions
                 """
@@ -0,0 +1,139 @@
+import cProfile
+import pstats
+import time
+
+
+class Profiler():
+    """A class that records the time spent and the number of calls in named
+    phases of a run, such as rendering or learning. Phases may be nested, the
+    time of a nested phase counts towards its own phase and not towards the
+    phase around it. Nothing is recorded until the profiler is enabled, so
+    the hooks cost a method call and an attribute check while it is off"""
+
+    def __init__(self):
+        """
+        Initialize a disabled profiler with no recorded phases
+        """
+        self.enabled = False
+        self.phases = {}
+        self.stack = []
+        self.start_time = None
+        self.games = 0
+        self.profile = None
+        self.profile_games = 0
+        self.profile_path = None
+        self.thread_profiles = []
+
+    def enable(self, profile_games=0, profile_path="connect4.prof"):
+        """
+        Start recording phases. If profile_games is positive the first
+        profile_games games are also run under cProfile and its statistics
+        are written to profile_path
+        """
+        self.enabled = True
+        self.start_time = time.perf_counter()
+        self.profile_games = profile_games
+        self.profile_path = profile_path
+
+    def start(self, name):
+        """
+        Enter the phase name
+        """
+        if not self.enabled:
+            return
+        self.stack.append([name, time.perf_counter(), 0.0])
+
+    def stop(self):
+        """
+        Leave the phase entered last
+        """
+        if not self.enabled:
+            return
+        (name, start, nested) = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = [0, 0.0, 0.0]
+        phase[0] += 1
+        phase[1] += elapsed
+        phase[2] += elapsed - nested
+
+    def start_game(self):
+        """
+        Mark the start of a game, profiling it with cProfile if it is one of
+        the first profile_games games
+        """
+        if not self.enabled:
+            return
+        if self.games < self.profile_games and self.profile is None:
+            self.profile = cProfile.Profile()
+        if self.profile is not None:
+            self.profile.enable()
+
+    def end_game(self):
+        """
+        Mark the end of a game and write the cProfile statistics once the
+        first profile_games games are over
+        """
+        if not self.enabled:
+            return
+        self.games += 1
+        if self.profile is not None:
+            self.profile.disable()
+            if self.games == self.profile_games:
+                self.write_profile()
+
+    def call(self, function, *args):
+        """
+        Return function(*args). While games are run under cProfile the call
+        gets a cProfile of its own, since cProfile only sees the thread that
+        enabled it, and its statistics are written along with the games'
+        """
+        if self.profile is None:
+            return function(*args)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # a cProfile that sees every thread is already running
+            return function(*args)
+        try:
+            return function(*args)
+        finally:
+            profile.disable()
+            self.thread_profiles.append(profile)
+
+    def write_profile(self):
+        """
+        Write the cProfile statistics of the games profiled so far, merged
+        with those of the calls made from other threads
+        """
+        self.profile.disable()
+        pstats.Stats(self.profile, *self.thread_profiles).dump_stats(self.profile_path)
+        print("Wrote cProfile statistics of %d games to %s" % (self.games, self.profile_path))
+        self.profile = None
+        self.thread_profiles = []
+
+    def report(self):
+        """
+        Print the calls, the total time including nested phases and the time
+        spent in each phase itself, next to its share of the run. If the run
+        ended before profile_games games, the games profiled so far are
+        written
+        """
+        if not self.enabled:
+            return
+        if self.profile is not None:
+            self.write_profile()
+        wall = time.perf_counter() - self.start_time
+        print("%-10s %10s %10s %10s %7s %12s" % ("phase", "calls", "total s", "self s", "self %", "us/call"))
+        for (name, (calls, total, own)) in sorted(self.phases.items(), key=lambda item: -item[1][2]):
+            print("%-10s %10d %10.3f %10.3f %6.1f%% %12.1f" % (
+                name, calls, total, own, 100.0 * own / wall, 1e6 * total / calls))
+        print("%d games in %.3fs" % (self.games, wall))
+
+
+# the profiler that the game and the players report to
+PROFILER = Profiler()
@@ -1,46 +1,73 @@
-import pygame
 import random
-import argparse
 
-# define some global variables
-BLUE = (0, 0, 255)
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BOARD_SIZE = (7,6)
+from Board import mirror_state_key
+from Constants import BOARD_SIZE
+from Players import Player
+from QTable import BoundedQTable, MappedQTable, QTable
 
-class ColumnFullException(Exception):
-    """An exception that will be thrown if a column of the board is full"""
-    def __init__(self, value):
-        self.value = value
-
-    def __str__(self):
-        return repr(self.value)
 
 class QLearningPlayer(Player):
     """A class that represents an AI using Q-learning algorithm"""
 
-    def __init__(self, coin_type, epsilon=0.2, alpha=0.3, gamma=0.9):
+    def __init__(self, coin_type, epsilon=0.2, alpha=0.3, gamma=0.9, symmetric=False, capacity=None, eviction="lru",
+                 learning=True):
         """
         Initialize a Q-learner with parameters epsilon, alpha and gamma
-        and its coin type
+        and its coin type. A symmetric Q-learner shares the Q values of
+        every state with its left to right mirror image. With a capacity
+        the Q table keeps at most that many states in memory and evicts
+        them by the eviction policy, "lru" or "visits". Without learning
+        the Q table is never changed by the moves played
         """
         Player.__init__(self, coin_type)
-        self.q = {}
+        (self.num_rows, self.num_columns) = BOARD_SIZE
+        self.capacity = capacity
+        self.eviction = eviction
+        if capacity is None:
+            self.q = QTable(self.num_columns)
+        else:
+            self.q = BoundedQTable(self.num_columns, capacity, eviction=eviction)
         self.epsilon = epsilon # e-greedy chance of random exploration
         self.alpha = alpha # learning rate
         self.gamma = gamma # discount factor for future rewards
+        self.symmetric = symmetric
+        self.learning = learning
+
+    def canonicalize(self, state, actions):
+        """
+        Return the key under which a state is stored in the Q table along
+        with the actions remapped to that key. Without symmetry this is the
+        state itself, otherwise it is the lesser of the state and its mirror
+        """
+        if self.symmetric:
+            mirrored = mirror_state_key(state, self.num_rows, self.num_columns)
+            if mirrored < state:
+                return (mirrored, [self.num_columns - 1 - a for a in actions])
+        return (state, actions)
 
     def getQ(self, state, action):
         """
         Return a probability for a given state and action where the greater
         the probability the better the move
         """
-        # encourage exploration; "optimistic" 1.0 initial values
-        if self.q.get((state, action)) is None:
-            self.q[(state, action)] = 1.0
-        return self.q.get((state, action))
+        # encourage exploration; new rows start at "optimistic" 1.0 values
+        (key, key_actions) = self.canonicalize(state, [action])
+        return self.q.get(key, key_actions[0])
+
+    def getQs(self, state, actions):
+        """
+        Return the probabilities of a list of actions in a given state
+        """
+        (key, key_actions) = self.canonicalize(state, actions)
+        return self.q.get_values(key, key_actions)
+
+    def setQ(self, state, action, value):
+        """
+        Set the probability of an action in a given state and count it as a
+        visit of the state and action
+        """
+        (key, key_actions) = self.canonicalize(state, [action])
+        self.q.update(key, key_actions[0], value)
 
     def choose_action(self, state, actions):
         """
@@ -53,7 +80,7 @@ class QLearningPlayer(Player):
             chosen_action = random.choice(actions)
             return chosen_action
 
-        qs = [self.getQ(current_state, a) for a in actions]
+        qs = self.getQs(current_state, actions)
         maxQ = max(qs)
 
         if qs.count(maxQ) > 1:
@@ -65,23 +92,54 @@ class QLearningPlayer(Player):
 
         return actions[i]
 
+    def get_reward(self, win_value, coin_type):
+        """
+        Return the reward of a finished game for the player of coin_type
+        """
+        if win_value == 0:
+            return 0.5
+        elif win_value == coin_type:
+            return 1
+        else:
+            return -2
+
+    def update(self, prev_state, chosen_action, reward, result_state, actions):
+        """
+        Update the Q value of the chosen action in prev_state using the
+        reward recieved and the maximum future reward of the actions in the
+        resulting state
+        """
+        prev = self.getQ(prev_state, chosen_action)
+        maxqnew = max(self.getQs(result_state, actions))
+        self.setQ(prev_state, chosen_action, prev + self.alpha * ((reward + self.gamma*maxqnew) - prev))
+
     def learn(self, board, actions, chosen_action, game_over, game_logic):
         """
         Determine the reward based on its current chosen action and update
         the Q table using the reward recieved and the maximum future reward
         based on the resulting state due to the chosen action
         """
+        if not self.learning:
+            return
         reward = 0
         if (game_over):
-            win_value = game_logic.get_winner()
-            if win_value == 0:
-                reward = 0.5
-            elif win_value == self.coin_type:
-                reward = 1
-            else:
-                reward = -2
-        prev_state = board.get_prev_state()
-        prev = self.getQ(prev_state, chosen_action)
-        result_state = board.get_state()
-        maxqnew = max([self.getQ(result_state, a) for a in actions])
-        self.q[(prev_state, chosen_action)] = prev + self.alpha * ((reward + self.gamma*maxqnew) - prev)
+            reward = self.get_reward(game_logic.get_winner(), self.coin_type)
+        self.update(board.get_prev_state_key(), chosen_action, reward, board.get_state_key(), actions)
+
+    def save(self, path):
+        """
+        Save the Q table to a binary file
+        """
+        self.q.save(path)
+
+    def load(self, path):
+        """
+        Replace the Q table with the one saved at path, memory-mapped. A
+        capacity limits the states changed after loading that stay in memory
+        """
+        table = MappedQTable(path, capacity=self.capacity, eviction=self.eviction)
+        if table.num_actions != self.num_columns:
+            table.close()
+            raise ValueError('%s holds %d actions per state but the board has %d columns' %
+                             (path, table.num_actions, self.num_columns))
+        self.q = table
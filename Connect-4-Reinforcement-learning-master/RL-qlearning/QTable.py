@@ -0,0 +1,555 @@
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from itertools import islice, repeat
+
+
+# magic, format version, number of actions, number of states
+FILE_HEADER = struct.Struct('<8sIIQ')
+FILE_MAGIC = b'C4QTABLE'
+FILE_VERSION = 1
+
+
+def write_table(path, num_actions, keys, values):
+    """
+    Write sorted state keys and their rows of values to path. The file is a
+    header followed by the keys as little endian unsigned 64 bit integers and
+    the values as little endian 32 bit floats, written to a temporary file
+    first so that processes mapping the old file keep a consistent copy
+    """
+    keys = array('Q', keys)
+    values = array('f', values)
+    if sys.byteorder == 'big':
+        keys.byteswap()
+        values.byteswap()
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, num_actions, len(keys)))
+        keys.tofile(f)
+        values.tofile(f)
+    os.replace(temp_path, path)
+
+
+def merge_tables(table, updates):
+    """
+    Merge the rows that other tables have visited into table and return the
+    merged (keys, values, visits). Every update is the (keys, values, counts)
+    triple returned by visited_rows, and each value becomes the average of
+    the updated values weighted by their visit counts
+    """
+    import numpy as np
+    n = table.num_actions
+    keys = np.concatenate([np.zeros(0, dtype=np.uint64)] + [update[0] for update in updates])
+    values = np.concatenate([np.zeros((0, n), dtype=np.float32)] + [update[1] for update in updates])
+    counts = np.concatenate([np.zeros((0, n), dtype=np.uint32)] + [update[2] for update in updates])
+    if len(keys) == 0:
+        return (keys, values, counts)
+
+    # sum the rows of every key, which sorting makes neighbours
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    counts = counts[order].astype(np.uint64)
+    visits = np.add.reduceat(counts, starts, axis=0)
+    sums = np.add.reduceat(counts * values[order].astype(np.float64), starts, axis=0)
+    merged = (keys[starts], (sums / np.maximum(visits, 1)).astype(np.float32), visits.astype(np.uint32))
+    table.update_rows(merged[0].tolist(), merged[1], merged[2])
+    return merged
+
+
+def update_row_by_row(get_offset, table_values, table_counts, keys, values, visits):
+    """
+    Set the values of the rows of keys in table_values where visits are not
+    zero and add the visits to table_counts, finding every row with
+    get_offset just before it is written. Bounded tables need this, adding a
+    row may evict one found earlier
+    """
+    n = values.shape[1]
+    for (key, row_values, row_visits) in zip(keys, values.tolist(), visits.tolist()):
+        offset = get_offset(key)
+        for a in range(n):
+            if row_visits[a]:
+                table_values[offset + a] = row_values[a]
+                table_counts[offset + a] += row_visits[a]
+
+
+class QTable():
+    """A class that stores the Q values of a Q-learner. Every state is an
+    encoded integer key that owns one row of num_actions values inside a
+    single flat array of 32 bit floats, next to a count of how many times
+    each value was updated"""
+
+    def __init__(self, num_actions, default=1.0):
+        """
+        Initialize an empty table where every new row starts with the
+        value default for each of the num_actions actions
+        """
+        self.num_actions = num_actions
+        self.default = default
+        self.default_row = array('f', [default]) * num_actions
+        self.zero_counts = array('I', [0]) * num_actions
+        self.index = {}
+        # the state of every row, the inverse of index
+        self.row_keys = array('Q')
+        self.values = array('f')
+        self.counts = array('I')
+
+    def __len__(self):
+        """
+        Return the number of states stored in the table
+        """
+        return len(self.index)
+
+    def __contains__(self, state):
+        """
+        Return True iff the table has a row for the state
+        """
+        return state in self.index
+
+    def add_row(self, state):
+        """
+        Append a row of default values for the state and return its number
+        """
+        row = len(self.index)
+        self.index[state] = row
+        self.row_keys.append(state)
+        self.values.extend(self.default_row)
+        self.counts.extend(self.zero_counts)
+        return row
+
+    def add_rows(self, states):
+        """
+        Append rows of default values for a list of new states and return
+        the number of the first one
+        """
+        row = len(self.index)
+        self.index.update(zip(states, range(row, row + len(states))))
+        self.row_keys.extend(states)
+        self.values.extend(self.default_row * len(states))
+        self.counts.extend(self.zero_counts * len(states))
+        return row
+
+    def find_rows(self, states):
+        """
+        Return the rows of a list of distinct states as a NumPy array, adding
+        rows for the states that have none, and the positions of those states
+        in the list
+        """
+        import numpy as np
+        rows = np.fromiter(map(self.index.get, states, repeat(-1)), dtype=np.int64, count=len(states))
+        added = np.flatnonzero(rows < 0)
+        if len(added):
+            rows[added] = self.add_rows([states[i] for i in added.tolist()]) + np.arange(len(added))
+        return (rows, added)
+
+    def find_row(self, state):
+        """
+        Return the number of the state's row or None if it has none
+        """
+        return self.index.get(state)
+
+    def get_offset(self, state):
+        """
+        Return the position of the first value of the state's row in the
+        values array, adding the row if the state is new
+        """
+        row = self.find_row(state)
+        if row is None:
+            row = self.add_row(state)
+        return row * self.num_actions
+
+    def get(self, state, action):
+        """
+        Return the value of an action in a given state. Reading a state
+        that has no row returns the default without adding one
+        """
+        row = self.find_row(state)
+        if row is None:
+            return self.default
+        return self.values[row * self.num_actions + action]
+
+    def get_values(self, state, actions):
+        """
+        Return the values of a list of actions in a given state
+        """
+        row = self.find_row(state)
+        if row is None:
+            return [self.default] * len(actions)
+        offset = row * self.num_actions
+        values = self.values
+        return [values[offset + a] for a in actions]
+
+    def set(self, state, action, value):
+        """
+        Set the value of an action in a given state
+        """
+        self.values[self.get_offset(state) + action] = value
+
+    def update(self, state, action, value, visits=1):
+        """
+        Set the value of an action in a given state and count the visits
+        that led to it
+        """
+        offset = self.get_offset(state) + action
+        self.values[offset] = value
+        self.counts[offset] += visits
+
+    def update_rows(self, keys, values, visits):
+        """
+        Set the values of the rows of a list of distinct keys where visits
+        are not zero and add the visits to their counts. values and visits
+        are NumPy arrays with one row per key
+        """
+        (rows, added) = self.find_rows(keys)
+        self.write_rows(rows, values, visits)
+
+    def write_rows(self, rows, values, visits):
+        """
+        Set the values of a NumPy array of distinct rows where visits are
+        not zero and add the visits to their counts
+        """
+        import numpy as np
+        if len(rows) == 0:
+            return
+        n = self.num_actions
+        positions = (rows[:, None] * n + np.arange(n)).ravel()
+        visits = visits.ravel()
+        visited = visits > 0
+        table_values = np.frombuffer(self.values, dtype='f')
+        table_counts = np.frombuffer(self.counts, dtype='I')
+        table_values[positions[visited]] = values.ravel()[visited]
+        table_counts[positions] += visits.astype(table_counts.dtype)
+        del table_values, table_counts
+
+    def clear_counts(self):
+        """
+        Forget every visit counted so far
+        """
+        self.counts = array('I', [0]) * len(self.counts)
+
+    def visited_rows(self):
+        """
+        Return the keys, values and visit counts of every row that has been
+        updated at least once, as NumPy arrays with one row per key
+        """
+        import numpy as np
+        n = self.num_actions
+        if not self.row_keys:
+            return (np.zeros(0, dtype=np.uint64), np.zeros((0, n), dtype=np.float32), np.zeros((0, n), dtype=np.uint32))
+        counts = np.frombuffer(self.counts, dtype='I').reshape(-1, n)
+        rows = np.flatnonzero(counts.any(axis=1))
+        keys = np.frombuffer(self.row_keys, dtype='Q')[rows].astype(np.uint64)
+        values = np.frombuffer(self.values, dtype='f').reshape(-1, n)[rows]
+        counts = counts[rows]
+        return (keys, values, counts)
+
+    def sorted_rows(self):
+        """
+        Return the state keys in ascending order and their rows of values
+        """
+        keys = sorted(self.index)
+        values = array('f')
+        n = self.num_actions
+        for key in keys:
+            offset = self.index[key] * n
+            values.extend(self.values[offset:offset + n])
+        return (keys, values)
+
+    def save(self, path):
+        """
+        Save the table to a binary file that MappedQTable can open
+        """
+        (keys, values) = self.sorted_rows()
+        write_table(path, self.num_actions, keys, values)
+
+
+class BoundedQTable(QTable):
+    """A class that stores the Q values of at most capacity states. Once the
+    table is full a new state takes the row of an evicted one, either the
+    least recently used state or, with eviction="visits", one of the eighth
+    of the states whose values were updated the fewest times, which are
+    evicted together so that the table is scanned once every few inserts.
+    Only the older half of the states can be evicted by visits, a new state
+    has had no time to be visited yet. Rows are added as states are and
+    only reused once they are freed"""
+
+    def __init__(self, num_actions, capacity, default=1.0, eviction="lru"):
+        """
+        Initialize an empty table that holds at most capacity states
+        """
+        if capacity < 1:
+            raise ValueError('a Q table needs room for at least one state')
+        if eviction not in ("lru", "visits"):
+            raise ValueError('unknown eviction policy %s' % eviction)
+        QTable.__init__(self, num_actions, default)
+        self.capacity = capacity
+        self.eviction = eviction
+        # ordered from the least to the most recently used state
+        self.index = OrderedDict()
+        self.free_rows = []
+        self.evictions = 0
+
+    def find_row(self, state):
+        """
+        Return the number of the state's row or None if it has none,
+        marking the state as the most recently used one
+        """
+        row = self.index.get(state)
+        if row is not None and self.eviction == "lru":
+            self.index.move_to_end(state)
+        return row
+
+    def add_row(self, state):
+        """
+        Give the state a row of default values, evicting states first if
+        the table is full, and return its number
+        """
+        if not self.free_rows and len(self.index) >= self.capacity:
+            self.evict()
+        if not self.free_rows:
+            return QTable.add_row(self, state)
+        row = self.free_rows.pop()
+        offset = row * self.num_actions
+        self.values[offset:offset + self.num_actions] = self.default_row
+        self.counts[offset:offset + self.num_actions] = self.zero_counts
+        self.index[state] = row
+        self.row_keys[row] = state
+        return row
+
+    def evict(self):
+        """
+        Remove the states chosen by the eviction policy and free their rows
+        """
+        if self.eviction == "lru":
+            victims = [next(iter(self.index))]
+        else:
+            (index, counts, n) = (self.index, self.counts, self.num_actions)
+
+            def visits(state):
+                offset = index[state] * n
+                return sum(counts[offset:offset + n])
+
+            # the index is in insertion order, leave out the newer half
+            older = islice(index, len(index) - len(index) // 2)
+            # ties go to the states that were added first
+            victims = heapq.nsmallest(max(1, len(index) // 8), older, key=visits)
+        n = self.num_actions
+        for state in victims:
+            row = self.index.pop(state)
+            # free rows must not look visited to visited_rows
+            self.counts[row * n:(row + 1) * n] = self.zero_counts
+            self.free_rows.append(row)
+        self.evictions += len(victims)
+
+    def update_rows(self, keys, values, visits):
+        """
+        Set the values of the rows of keys where visits are not zero and add
+        the visits to their counts, one row at a time
+        """
+        update_row_by_row(self.get_offset, self.values, self.counts, keys, values, visits)
+
+
+class MappedQTable():
+    """A class that serves the Q values of a table saved with QTable.save
+    straight from a read-only memory map of the file, so opening it costs
+    the same whatever its size and processes that open the same file share
+    its pages. Values that change after loading and states that are not in
+    the file are kept in an in-memory QTable on top of the mapped rows. With
+    a capacity that table is a BoundedQTable, and an evicted state falls back
+    to its mapped values"""
+
+    def __init__(self, path, default=1.0, capacity=None, eviction="lru"):
+        """
+        Map the table saved at path
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                raise ValueError('%s is not a Q table file' % path)
+            (magic, version, num_actions, count) = FILE_HEADER.unpack(header)
+            if magic != FILE_MAGIC or version != FILE_VERSION:
+                raise ValueError('%s is not a Q table file' % path)
+            self.file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.num_actions = num_actions
+        self.count = count
+        keys_start = FILE_HEADER.size
+        values_start = keys_start + 8 * count
+        values_end = values_start + 4 * count * num_actions
+        if len(self.file_map) < values_end:
+            self.file_map.close()
+            raise ValueError('%s is truncated' % path)
+
+        view = memoryview(self.file_map)
+        if sys.byteorder == 'little':
+            self.keys = view[keys_start:values_start].cast('Q')
+            self.mapped_values = view[values_start:values_end].cast('f')
+        else:
+            # the file is little endian, so big endian machines need a copy
+            self.keys = array('Q', view[keys_start:values_start].tobytes())
+            self.keys.byteswap()
+            self.mapped_values = array('f', view[values_start:values_end].tobytes())
+            self.mapped_values.byteswap()
+        view.release()
+        if capacity is None:
+            self.overlay = QTable(num_actions, default)
+        else:
+            self.overlay = BoundedQTable(num_actions, capacity, default, eviction)
+        self.default = default
+
+    def __len__(self):
+        """
+        Return the number of states stored in the table
+        """
+        return self.count + sum(1 for state in self.overlay.index if self.find(state) is None)
+
+    def __contains__(self, state):
+        """
+        Return True iff the table has a row for the state
+        """
+        return state in self.overlay or self.find(state) is not None
+
+    def find(self, state):
+        """
+        Return the position of the state among the mapped keys or None
+        """
+        i = bisect.bisect_left(self.keys, state)
+        if i < self.count and self.keys[i] == state:
+            return i
+        return None
+
+    def get_overlay_offset(self, state):
+        """
+        Return the offset of the state's row in the overlay, copying the
+        mapped row into the overlay first if there is one
+        """
+        row = self.overlay.find_row(state)
+        if row is not None:
+            return row * self.num_actions
+        i = self.find(state)
+        offset = self.overlay.get_offset(state)
+        if i is not None:
+            n = self.num_actions
+            self.overlay.values[offset:offset + n] = array('f', self.mapped_values[i * n:(i + 1) * n])
+        return offset
+
+    def get(self, state, action):
+        """
+        Return the value of an action in a given state
+        """
+        row = self.overlay.find_row(state)
+        if row is not None:
+            return self.overlay.values[row * self.num_actions + action]
+        i = self.find(state)
+        if i is not None:
+            return self.mapped_values[i * self.num_actions + action]
+        return self.default
+
+    def get_values(self, state, actions):
+        """
+        Return the values of a list of actions in a given state
+        """
+        row = self.overlay.find_row(state)
+        if row is not None:
+            (values, offset) = (self.overlay.values, row * self.num_actions)
+        else:
+            i = self.find(state)
+            if i is None:
+                return [self.default] * len(actions)
+            (values, offset) = (self.mapped_values, i * self.num_actions)
+        return [values[offset + a] for a in actions]
+
+    def set(self, state, action, value):
+        """
+        Set the value of an action in a given state
+        """
+        self.overlay.values[self.get_overlay_offset(state) + action] = value
+
+    def update(self, state, action, value, visits=1):
+        """
+        Set the value of an action in a given state and count the visits
+        that led to it
+        """
+        offset = self.get_overlay_offset(state) + action
+        self.overlay.values[offset] = value
+        self.overlay.counts[offset] += visits
+
+    def update_rows(self, keys, values, visits):
+        """
+        Set the values of the rows of keys where visits are not zero and add
+        the visits to their counts
+        """
+        if isinstance(self.overlay, BoundedQTable):
+            update_row_by_row(self.get_overlay_offset, self.overlay.values, self.overlay.counts, keys, values, visits)
+            return
+        import numpy as np
+        (rows, added) = self.overlay.find_rows(keys)
+        if len(added) and self.count:
+            # copy the mapped rows of the new overlay rows before they are updated
+            n = self.num_actions
+            wanted = np.array(keys, dtype=np.uint64)[added]
+            mapped_keys = np.frombuffer(self.keys, dtype='Q')
+            found = np.minimum(np.searchsorted(mapped_keys, wanted), self.count - 1)
+            in_file = mapped_keys[found] == wanted
+            overlay_values = np.frombuffer(self.overlay.values, dtype='f').reshape(-1, n)
+            overlay_values[rows[added[in_file]]] = np.frombuffer(self.mapped_values, dtype='f').reshape(-1, n)[found[in_file]]
+            del mapped_keys, overlay_values
+        self.overlay.write_rows(rows, values, visits)
+
+    def clear_counts(self):
+        """
+        Forget every visit counted so far
+        """
+        self.overlay.clear_counts()
+
+    def visited_rows(self):
+        """
+        Return the keys, values and visit counts of every row that has been
+        updated since the file was mapped or the counts were cleared
+        """
+        return self.overlay.visited_rows()
+
+    def sorted_rows(self):
+        """
+        Return the state keys in ascending order and their rows of values,
+        merging the overlay into the mapped rows
+        """
+        (overlay_keys, overlay_values) = self.overlay.sorted_rows()
+        keys = []
+        values = array('f')
+        n = self.num_actions
+        i = 0
+        for (k, key) in enumerate(overlay_keys):
+            while i < self.count and self.keys[i] < key:
+                keys.append(self.keys[i])
+                values.extend(self.mapped_values[i * n:(i + 1) * n])
+                i += 1
+            if i < self.count and self.keys[i] == key:
+                i += 1
+            keys.append(key)
+            values.extend(overlay_values[k * n:(k + 1) * n])
+        keys.extend(self.keys[i:self.count])
+        values.extend(self.mapped_values[i * n:self.count * n])
+        return (keys, values)
+
+    def save(self, path):
+        """
+        Save the table, including any changes made since it was mapped
+        """
+        (keys, values) = self.sorted_rows()
+        write_table(path, self.num_actions, keys, values)
+
+    def close(self):
+        """
+        Unmap the file
+        """
+        if isinstance(self.keys, memoryview):
+            self.keys.release()
+            self.mapped_values.release()
+        self.file_map.close()
@@ -0,0 +1,282 @@
+import argparse
+import random
+import time
+
+from Board import BitBoardLayout, decode_state_key
+from Constants import BOARD_SIZE
+from Players import Player
+
+
+class SearchTimeout(Exception):
+    """An exception that will be thrown when a search runs out of time"""
+    pass
+
+
+class SearchPlayer(Player):
+    """A class that represents an AI that searches the game tree with negamax
+    and alpha-beta pruning. Positions are a pair of bitboards laid out like
+    BitBoard: the coins of the player to move and the coins of both players"""
+
+    # transposition table entry bounds
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+    # scale of the scores of won positions, above any heuristic score
+    WIN_SCORE = 100
+    # number of nodes searched between two looks at the clock
+    CLOCK_INTERVAL = 1024
+
+    def __init__(self, coin_type, time_budget=0.5, max_depth=None, table_size=1 << 18):
+        """
+        Initialize a search player that spends up to time_budget seconds on
+        a move, searching at most max_depth moves ahead and remembering up to
+        table_size positions between searches
+        """
+        Player.__init__(self, coin_type)
+        (self.num_rows, self.num_columns) = BOARD_SIZE
+        self.total_slots = self.num_rows * self.num_columns
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.layout = BitBoardLayout(self.num_rows, self.num_columns)
+        # kept on the player as well, the search reads them at every node
+        self.column_masks = self.layout.column_masks
+        self.bottom_mask = self.layout.bottom_mask
+        self.board_mask = self.layout.board_mask
+        self.win_shifts = self.layout.win_shifts
+        # explore the centre columns first, they take part in the most lines
+        centre = (self.num_columns - 1) / 2.0
+        self.move_order = sorted(range(self.num_columns), key=lambda j: abs(j - centre))
+
+        self.table_size = table_size
+        self.table = [None] * table_size
+        self.generation = 0
+        self.deadline = float("inf")
+        # set from another thread to end the search early
+        self.stopped = False
+        self.nodes = 0
+        self.depth_reached = 0
+        self.search_time = 0.0
+
+    def choose_action(self, state, actions):
+        """
+        Return the best action found for the encoded state within the time
+        budget
+        """
+        (first, mask) = decode_state_key(state, self.num_rows, self.num_columns)
+        position = first if self.coin_type == 1 else first ^ mask
+        action = self.search(position, mask)
+        if action not in actions:
+            return random.choice(actions)
+        return action
+
+    def learn(self, board, actions, action, game_over, game_logic):
+        """
+        The search player does not learn from its actions
+        """
+        pass
+
+    def count_coins(self, bitboard):
+        """
+        Return the number of coins in a bitboard
+        """
+        return bin(bitboard).count("1")
+
+    def winning_slots(self, position, mask):
+        """
+        Return the empty slots that would complete a winning sequence for the
+        coins in position
+        """
+        # vertical
+        result = (position << 1) & (position << 2) & (position << 3)
+        for shift in self.win_shifts[1:]:
+            pair = (position << shift) & (position << (2 * shift))
+            result |= pair & (position << (3 * shift))
+            result |= pair & (position >> shift)
+            pair = (position >> shift) & (position >> (2 * shift))
+            result |= pair & (position << shift)
+            result |= pair & (position >> (3 * shift))
+        return result & (self.board_mask ^ mask)
+
+    def win_score(self, moves):
+        """
+        Return the score of winning with the coin played after moves coins,
+        earlier wins score higher
+        """
+        return SearchPlayer.WIN_SCORE * (self.total_slots + 1 - moves)
+
+    def evaluate(self, position, mask):
+        """
+        Return a heuristic score of a position for the player to move, the
+        difference between the number of slots that would win for either
+        player
+        """
+        return (self.count_coins(self.winning_slots(position, mask)) -
+                self.count_coins(self.winning_slots(position ^ mask, mask)))
+
+    def negamax(self, position, mask, moves, depth, alpha, beta):
+        """
+        Return the score of a position for the player to move, searched depth
+        moves ahead within the window alpha, beta
+        """
+        self.nodes += 1
+        if self.nodes % SearchPlayer.CLOCK_INTERVAL == 0 and (self.stopped or time.perf_counter() > self.deadline):
+            raise SearchTimeout()
+
+        if moves == self.total_slots:
+            return 0
+        possible = (mask + self.bottom_mask) & self.board_mask
+        if self.winning_slots(position, mask) & possible:
+            return self.win_score(moves)
+        if depth == 0:
+            return self.evaluate(position, mask)
+
+        # a move the opponent wins with must be blocked, two of them cannot
+        threats = self.winning_slots(position ^ mask, mask) & possible
+        if threats:
+            if threats & (threats - 1):
+                return -self.win_score(moves + 1)
+            possible = threats
+
+        alpha_orig = alpha
+        key = position + mask
+        index = key % self.table_size
+        entry = self.table[index]
+        table_move = None
+        if entry is not None and entry[0] == key:
+            table_move = entry[4]
+            if entry[1] >= depth:
+                score = entry[3]
+                if entry[2] == SearchPlayer.EXACT:
+                    return score
+                elif entry[2] == SearchPlayer.LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        order = self.move_order
+        if table_move is not None:
+            order = [table_move] + [j for j in order if j != table_move]
+
+        best_score = None
+        best_move = None
+        opponent = position ^ mask
+        for j in order:
+            move = possible & self.column_masks[j]
+            if not move:
+                continue
+            score = -self.negamax(opponent, mask | move, moves + 1, depth - 1, -beta, -alpha)
+            if best_score is None or score > best_score:
+                best_score = score
+                best_move = j
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+        if best_score <= alpha_orig:
+            flag = SearchPlayer.UPPER
+        elif best_score >= beta:
+            flag = SearchPlayer.LOWER
+        else:
+            flag = SearchPlayer.EXACT
+        # keep deeper results of the current search over shallower ones
+        if (entry is None or entry[0] == key or entry[5] != self.generation or entry[1] <= depth):
+            self.table[index] = (key, depth, flag, best_score, best_move, self.generation)
+
+        return best_score
+
+    def search_root(self, position, mask, moves, depth, first_move):
+        """
+        Return the score and the best column of a position searched depth
+        moves ahead, trying first_move before the others
+        """
+        order = [first_move] + [j for j in self.move_order if j != first_move]
+        possible = (mask + self.bottom_mask) & self.board_mask
+        opponent = position ^ mask
+        alpha = -SearchPlayer.WIN_SCORE * (self.total_slots + 2)
+        beta = -alpha
+        best_move = first_move
+        for j in order:
+            move = possible & self.column_masks[j]
+            if not move:
+                continue
+            score = -self.negamax(opponent, mask | move, moves + 1, depth - 1, -beta, -alpha)
+            if score > alpha:
+                alpha = score
+                best_move = j
+
+        return (alpha, best_move)
+
+    def search(self, position, mask):
+        """
+        Return the best column for the player to move, deepening the search
+        one move at a time until it runs out of time, moves or max_depth
+        """
+        start = time.perf_counter()
+        self.generation += 1
+        self.nodes = 0
+        self.depth_reached = 0
+        moves = self.count_coins(mask)
+        possible = (mask + self.bottom_mask) & self.board_mask
+        legal = [j for j in self.move_order if possible & self.column_masks[j]]
+
+        wins = self.winning_slots(position, mask) & possible
+        best_move = legal[0]
+        for j in legal:
+            if wins & self.column_masks[j]:
+                self.search_time = time.perf_counter() - start
+                return j
+
+        max_depth = self.total_slots - moves
+        if self.max_depth is not None:
+            max_depth = min(max_depth, self.max_depth)
+        # the first iteration always completes so there is a move to play
+        self.deadline = float("inf")
+        try:
+            for depth in range(1, max_depth + 1):
+                (score, best_move) = self.search_root(position, mask, moves, depth, best_move)
+                self.depth_reached = depth
+                self.deadline = start + self.time_budget
+                if abs(score) >= SearchPlayer.WIN_SCORE:
+                    break
+                if time.perf_counter() > self.deadline:
+                    break
+        except SearchTimeout:
+            pass
+
+        self.search_time = time.perf_counter() - start
+        return best_move
+
+
+def benchmark(time_budget=1.0, positions=10, seed=0):
+    """
+    Search random positions for time_budget seconds each and print the
+    nodes per second and the depth reached for every position
+    """
+    rng = random.Random(seed)
+    player = SearchPlayer(1, time_budget)
+    total_nodes = 0
+    total_time = 0.0
+    print("%8s %6s %6s %10s %12s" % ("position", "coins", "depth", "nodes", "nodes/s"))
+    for i in range(positions):
+        # play a few random moves that do not end the game
+        (position, mask) = player.layout.random_position(rng, 8)
+        player.table = [None] * player.table_size
+        player.search(position, mask)
+        total_nodes += player.nodes
+        total_time += player.search_time
+        print("%8d %6d %6d %10d %12.0f" % (i, player.count_coins(mask), player.depth_reached,
+                                           player.nodes, player.nodes / player.search_time))
+    print("total: %d nodes in %.2fs, %.0f nodes/s" % (total_nodes, total_time, total_nodes / total_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--time', type=float, default=1.0, help="Seconds to search each position for")
+    parser.add_argument('--positions', type=int, default=10, help="Number of random positions to search")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random positions")
+    args = parser.parse_args()
+
+    benchmark(args.time, args.positions, args.seed)
@@ -1,22 +1,4 @@
-import pygame
-import random
-import argparse
-
-# define some global variables
-BLUE = (0, 0, 255)
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BOARD_SIZE = (7,6)
-
-class ColumnFullException(Exception):
-    """An exception that will be thrown if a column of the board is full"""
-    def __init__(self, value):
-        self.value = value
-
-    def __str__(self):
-        return repr(self.value)
+from Constants import GREEN, WHITE
 
 
 class Slot():
@@ -31,7 +13,6 @@ class Slot():
         self.col_index = col_index
         self.width = width
         self.height = height
-        self.surface = pygame.Surface((width*2, height*2))
         self.x_pos = x1
         self.y_pos = y1
 
@@ -68,9 +49,9 @@ class Slot():
 
     def draw(self, background):
         """
-        Draws a slot on the screen
+        Draws a slot on the screen and returns the region it covers
         """
-        pygame.draw.rect(self.surface, GREEN, (0, 0, self.width, self.height))
-        pygame.draw.rect(self.surface, WHITE, (1,1,self.width - 2,self.height - 2))
-        self.surface = self.surface.convert()
-        background.blit(self.surface, (self.x_pos, self.y_pos))
+        # imported here so that slots can be created without pygame
+        from Sprites import SPRITES
+        tile = SPRITES.slot_tile(self.width, self.height, GREEN, WHITE)
+        return background.blit(tile, (self.x_pos, self.y_pos))
@@ -0,0 +1,67 @@
+import pygame
+
+
+class SpriteCache():
+    """A class that renders the slot tiles, the coins and the empty board
+    once and hands out the same surfaces afterwards. Surfaces are converted
+    to the display format, so they are created on first use, after the
+    display mode is set, and dropped with clear if the display changes"""
+
+    def __init__(self):
+        """
+        Initialize an empty cache
+        """
+        self.surfaces = {}
+
+    def clear(self):
+        """
+        Drop every cached surface
+        """
+        self.surfaces = {}
+
+    def slot_tile(self, width, height, border_color, color):
+        """
+        Return a slot of the given size filled with color inside a one pixel
+        border of border_color
+        """
+        key = ("slot", width, height, border_color, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = pygame.Surface((width, height))
+            pygame.draw.rect(surface, border_color, (0, 0, width, height))
+            pygame.draw.rect(surface, color, (1, 1, width - 2, height - 2))
+            surface = self.surfaces[key] = surface.convert()
+        return surface
+
+    def empty_board(self, num_rows, num_columns, width, height, border_color, color):
+        """
+        Return a whole board of num_rows by num_columns empty slots
+        """
+        key = ("board", num_rows, num_columns, width, height, border_color, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            tile = self.slot_tile(width, height, border_color, color)
+            surface = pygame.Surface((num_columns * width, num_rows * height))
+            for i in range(num_rows):
+                for j in range(num_columns):
+                    surface.blit(tile, (j * width, i * height))
+            surface = self.surfaces[key] = surface.convert()
+        return surface
+
+    def coin(self, color, backdrop, size, centre, radius):
+        """
+        Return a square of the given size filled with backdrop holding a
+        coin of color and radius around centre
+        """
+        key = ("coin", color, backdrop, size, centre, radius)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = pygame.Surface((size, size))
+            surface.fill(backdrop)
+            pygame.draw.circle(surface, color, centre, radius)
+            surface = self.surfaces[key] = surface.convert()
+        return surface
+
+
+# the cache that the board, the slots and the coins draw from
+SPRITES = SpriteCache()
@@ -0,0 +1,295 @@
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+from Board import BitBoard
+from Constants import BOARD_SIZE
+from GameLogic import GameLogic
+from Players import ComputerPlayer
+from Trainer import HeadlessCoin
+
+
+def parse_value(text):
+    """
+    Return text as an int or a float if it is one, otherwise as it is
+    """
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_spec(spec):
+    """
+    Return the (label, player type, options) of a player spec of the form
+    [label=]type[:name=value,...], for example old=qlearner:qtable=old.qt
+    """
+    (head, _, tail) = spec.partition(':')
+    (label, _, player_type) = head.rpartition('=')
+    options = {}
+    for option in tail.split(','):
+        if option:
+            (name, _, value) = option.partition('=')
+            options[name] = parse_value(value)
+    return (label or spec, player_type, options)
+
+
+def create_player(spec):
+    """
+    Return a ComputerPlayer for a player spec. A qtable option is the file
+    of a saved Q table to load, every other option is passed on to the player.
+    A Q-learner is rated as it is, it neither learns nor explores unless its
+    spec sets learning=1 or an epsilon
+    """
+    (label, player_type, options) = parse_spec(spec)
+    options = dict(options)
+    qtable = options.pop("qtable", None)
+    if player_type == "qlearner":
+        options["learning"] = bool(options.get("learning", 0))
+        if not options["learning"]:
+            options.setdefault("epsilon", 0)
+    player = ComputerPlayer(1, player_type, **options)
+    if qtable is not None:
+        player.load(qtable)
+    return player
+
+
+def play_game(first, second, first_coin_type):
+    """
+    Play a game on a BitBoard where first moves first with first_coin_type
+    and return the score of first: 1 for a win, 0.5 for a tie and 0 for a
+    loss
+    """
+    board = BitBoard(BOARD_SIZE[0], BOARD_SIZE[1])
+    game_logic = GameLogic(board)
+    first.set_coin_type(first_coin_type)
+    second.set_coin_type(2 if first_coin_type == 1 else 1)
+    players = (first, second)
+    turn = 0
+    game_over = False
+    while not game_over:
+        player = players[turn]
+        game_over = player.complete_move(HeadlessCoin(player.get_coin_type()), board, game_logic, None)
+        turn = 1 - turn
+
+    winner_value = game_logic.get_winner()
+    if winner_value == 0:
+        return 0.5
+    return 1.0 if winner_value == first_coin_type else 0.0
+
+
+def play_match(job):
+    """
+    Play games games between the players of two specs, alternating the
+    first move starting with the first player, and return the pair and the
+    score of the first player in every game. Runs in the worker processes
+    """
+    (pair, spec_a, spec_b, games, seed) = job
+    random.seed(seed)
+    player_a = create_player(spec_a)
+    player_b = create_player(spec_b)
+    scores = []
+    for i in range(games):
+        first_coin_type = random.randint(1, 2)
+        if i % 2 == 0:
+            scores.append(play_game(player_a, player_b, first_coin_type))
+        else:
+            scores.append(1.0 - play_game(player_b, player_a, first_coin_type))
+    return (pair, scores)
+
+
+def bradley_terry(num_players, results, iterations=1000, tolerance=1e-9):
+    """
+    Return the Elo ratings, averaging 0, that best explain the results
+    under the Bradley-Terry model. results maps a pair (i, j) to the scores
+    of player i against player j. Ties count as half a win for both sides
+    and every pair that played gets one extra virtual tie, which keeps the
+    ratings finite when a player wins or loses every game
+    """
+    wins = [0.0] * num_players
+    games = {}
+    for ((i, j), scores) in results.items():
+        if not scores:
+            continue
+        score = sum(scores) + 0.5
+        wins[i] += score
+        wins[j] += len(scores) + 1 - score
+        games[(i, j)] = len(scores) + 1
+
+    strengths = [1.0] * num_players
+    for iteration in range(iterations):
+        # minorization-maximization update of Hunter (2004)
+        denominators = [0.0] * num_players
+        for ((i, j), n) in games.items():
+            d = n / (strengths[i] + strengths[j])
+            denominators[i] += d
+            denominators[j] += d
+        updated = [wins[i] / denominators[i] if denominators[i] > 0 else strengths[i]
+                   for i in range(num_players)]
+        log_mean = sum(math.log(s) for s in updated) / num_players
+        updated = [s / math.exp(log_mean) for s in updated]
+        change = max(abs(math.log(a) - math.log(b)) for (a, b) in zip(updated, strengths))
+        strengths = updated
+        if change < tolerance:
+            break
+
+    return [400.0 * math.log10(s) for s in strengths]
+
+
+def bootstrap(num_players, results, samples=200, seed=0):
+    """
+    Return the ratings of samples resamplings of the games of every pair
+    """
+    rng = random.Random(seed)
+    ratings = []
+    for k in range(samples):
+        resampled = {}
+        for (pair, scores) in results.items():
+            resampled[pair] = [rng.choice(scores) for score in scores]
+        ratings.append(bradley_terry(num_players, resampled))
+    return ratings
+
+
+def interval(values, confidence=0.95):
+    """
+    Return the bounds of the central confidence share of values
+    """
+    values = sorted(values)
+    low = int(math.floor((1.0 - confidence) / 2.0 * (len(values) - 1)))
+    high = int(math.ceil((1.0 + confidence) / 2.0 * (len(values) - 1)))
+    return (values[low], values[high])
+
+
+class Tournament():
+    """A class that plays every pair of a list of players against each other
+    in headless games spread over a pool of worker processes and rates the
+    players from the results"""
+
+    def __init__(self, specs, games=100, processes=None, chunk_games=50, seed=0):
+        """
+        Initialize a round robin of games games, an even number, for every
+        pair of player specs. Worker processes play chunk_games of them at a
+        time, a processes of 1 plays every game in this process
+        """
+        self.specs = specs
+        self.labels = [parse_spec(spec)[0] for spec in specs]
+        self.games = games
+        self.processes = processes
+        self.chunk_games = chunk_games + chunk_games % 2
+        self.seed = seed
+        self.results = {}
+
+    def jobs(self):
+        """
+        Return the chunks of games to play, each one with its own seed
+        """
+        rng = random.Random(self.seed)
+        jobs = []
+        for i in range(len(self.specs)):
+            for j in range(i + 1, len(self.specs)):
+                for start in range(0, self.games, self.chunk_games):
+                    games = min(self.chunk_games, self.games - start)
+                    jobs.append(((i, j), self.specs[i], self.specs[j], games, rng.getrandbits(32)))
+        return jobs
+
+    def run(self):
+        """
+        Play every game and return the scores of every pair
+        """
+        jobs = self.jobs()
+        self.results = {}
+        start = time.perf_counter()
+        if self.processes == 1:
+            finished = map(play_match, jobs)
+        else:
+            pool = multiprocessing.Pool(self.processes)
+            finished = pool.imap_unordered(play_match, jobs)
+        for (pair, scores) in finished:
+            self.results.setdefault(pair, []).extend(scores)
+        if self.processes != 1:
+            pool.close()
+            pool.join()
+        elapsed = time.perf_counter() - start
+
+        total = sum(len(scores) for scores in self.results.values())
+        print("Played %d games in %.2fs (%.0f games/min)" % (total, elapsed, 60.0 * total / elapsed))
+        return self.results
+
+    def ratings(self, samples=200, confidence=0.95):
+        """
+        Return the rating of every player, its confidence interval and the
+        bootstrapped ratings the interval comes from
+        """
+        ratings = bradley_terry(len(self.specs), self.results)
+        resampled = bootstrap(len(self.specs), self.results, samples, self.seed)
+        intervals = [interval([sample[i] for sample in resampled], confidence) for i in range(len(self.specs))]
+        return (ratings, intervals, resampled)
+
+    def report(self, ratings, intervals):
+        """
+        Print the players from best to worst with their ratings and scores
+        """
+        totals = [[0.0, 0] for spec in self.specs]
+        for ((i, j), scores) in self.results.items():
+            totals[i][0] += sum(scores)
+            totals[i][1] += len(scores)
+            totals[j][0] += len(scores) - sum(scores)
+            totals[j][1] += len(scores)
+        width = max(len(label) for label in self.labels)
+        print("%-*s %8s %18s %8s %7s" % (width, "player", "elo", "95% interval", "games", "score"))
+        for i in sorted(range(len(self.specs)), key=lambda i: -ratings[i]):
+            (score, games) = totals[i]
+            print("%-*s %8.1f %8.1f..%8.1f %8d %6.1f%%" % (
+                width, self.labels[i], ratings[i], intervals[i][0], intervals[i][1],
+                games, 100.0 * score / games if games else 0.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a round robin between computer players and rate them")
+    parser.add_argument('players', nargs='+', help="Player specs [label=]type[:name=value,...] where type is random, qlearner, search, mcts or dqn, "
+                                                   "for example new=qlearner:qtable=new.qt or search:time_budget=0.01, "
+                                                   "Q-learners neither learn nor explore unless given learning=1 or an epsilon")
+    parser.add_argument('--games', type=int, default=100, help="Number of games every pair plays")
+    parser.add_argument('--processes', type=int, default=0, help="Number of worker processes, 0 uses every core")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the games and of the bootstrap")
+    parser.add_argument('--bootstrap', type=int, default=200, help="Number of resamplings for the confidence intervals")
+    parser.add_argument('--json', help="File to write the results and ratings to")
+    parser.add_argument('--gate', nargs=2, metavar=("CANDIDATE", "INCUMBENT"),
+                        help="Exit with status 1 unless the candidate is rated above the incumbent with 95%% confidence")
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error("a tournament needs at least two players")
+
+    tournament = Tournament(args.players, args.games, args.processes or None, seed=args.seed)
+    if args.gate is not None:
+        for label in args.gate:
+            if label not in tournament.labels:
+                parser.error("--gate player %s is not one of the players %s" % (label, ", ".join(tournament.labels)))
+    tournament.run()
+    (ratings, intervals, resampled) = tournament.ratings(args.bootstrap)
+    tournament.report(ratings, intervals)
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "players": [{"label": label, "spec": spec, "elo": rating, "interval": list(bounds)}
+                            for (label, spec, rating, bounds) in zip(tournament.labels, args.players, ratings, intervals)],
+                "pairs": [{"players": [tournament.labels[i], tournament.labels[j]], "games": len(scores), "score": sum(scores)}
+                          for ((i, j), scores) in sorted(tournament.results.items())],
+                "games": args.games,
+                "seed": args.seed,
+            }, f, indent=2)
+
+    if args.gate is not None:
+        (candidate, incumbent) = (tournament.labels.index(args.gate[0]), tournament.labels.index(args.gate[1]))
+        (low, high) = interval([sample[candidate] - sample[incumbent] for sample in resampled])
+        print("%s - %s: %.1f Elo, 95%% interval %.1f..%.1f" % (
+            args.gate[0], args.gate[1], ratings[candidate] - ratings[incumbent], low, high))
+        if low <= 0:
+            sys.exit(1)
@@ -0,0 +1,385 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from Board import BitBoard, ColumnFullException
+from Constants import BOARD_SIZE
+from GameLogic import GameLogic
+from GameRecord import GameRecorder, read_games, read_header
+from Players import ComputerPlayer
+from Profiler import PROFILER
+from QTable import merge_tables
+
+
+class HeadlessCoin():
+    """A class that represents a coin that is never drawn, it only keeps
+    track of its type and its position on the board"""
+
+    def __init__(self, coin_type):
+        """
+        Initialize a coin with a given coin_type
+        """
+        self.coin_type = coin_type
+        self.col = 0
+        self.row = None
+
+    def set_column(self, col):
+        """
+        Set the column on the board in which the coin belongs
+        """
+        self.col = col
+
+    def get_column(self):
+        """
+        Get the column on the board in which the coin belongs in
+        """
+        return self.col
+
+    def set_row(self, row):
+        """
+        Set the row on the board where the coin is
+        """
+        self.row = row
+
+    def get_row(self):
+        """
+        Get the row on the board in which the coin belongs
+        """
+        return self.row
+
+    def move_right(self, background, step=1):
+        """
+        Move the coin to the column that is right of its current column
+        """
+        self.set_column(self.col + 1)
+
+    def move_left(self, background):
+        """
+        Move the coin to the column that is left of its current column
+        """
+        self.set_column(self.col - 1)
+
+    def drop(self, background, row_num):
+        """
+        Drop the coin to the bottom most possible slot in its column
+        """
+        self.set_row(row_num)
+
+    def get_coin_type(self):
+        """
+        Return the coin type
+        """
+        return self.coin_type
+
+    def draw(self, background):
+        """
+        A headless coin has nothing to draw
+        """
+        pass
+
+
+class Trainer():
+    """A class that trains computer players against each other without a
+    display, a window or a frame clock"""
+
+    def __init__(self, opponent_type="qlearner", symmetric=False, opponent_options=None, capacity=None, eviction="lru",
+                 recorder=None):
+        """
+        Initialize a Q-learner and the opponent it trains against, symmetric
+        Q-learners share the values of mirrored states. opponent_options are
+        passed on to any opponent that is not a Q-learner, capacity and
+        eviction limit the Q tables of the Q-learners. Every game is appended
+        to the GameRecorder recorder if there is one
+        """
+        self.p1 = ComputerPlayer(1, "qlearner", symmetric=symmetric, capacity=capacity, eviction=eviction)
+        if opponent_type == "qlearner":
+            self.p2 = ComputerPlayer(2, opponent_type, symmetric=symmetric, capacity=capacity, eviction=eviction)
+        else:
+            self.p2 = ComputerPlayer(2, opponent_type, **(opponent_options or {}))
+        self.recorder = recorder
+        self.trainedComputer = None
+        self.win_list = [0, 0]
+        self.ties = 0
+
+    def play_game(self):
+        """
+        Play a single game between the two players on a BitBoard and return
+        the winner's coin type, 0 for a tie
+        """
+        board = BitBoard(BOARD_SIZE[0], BOARD_SIZE[1])
+        game_logic = GameLogic(board)
+        first_coin_type = random.randint(1,2)
+        second_coin_type = 2 if first_coin_type == 1 else 1
+        self.p1.set_coin_type(first_coin_type)
+        self.p2.set_coin_type(second_coin_type)
+
+        current_type = random.randint(1,2)
+        first_mover = current_type
+        p1_turn = (self.p1.get_coin_type() == current_type)
+        (start, start_clock) = (time.time(), time.perf_counter())
+        game_over = False
+        while not game_over:
+            current_player = self.p1 if p1_turn else self.p2
+            coin = HeadlessCoin(current_type)
+            game_over = current_player.complete_move(coin, board, game_logic, None)
+            current_type = 1 if current_type == 2 else 2
+            p1_turn = not p1_turn
+
+        if self.recorder is not None:
+            self.recorder.record(first_mover, board.moves, game_logic.get_winner(), start,
+                                 time.perf_counter() - start_clock, kind="headless")
+        return game_logic.get_winner()
+
+    def record_result(self, winner_value):
+        """
+        Count the result of the last game played
+        """
+        if winner_value == 0:
+            self.ties += 1
+        elif winner_value == self.p1.get_coin_type():
+            self.win_list[0] += 1
+        else:
+            self.win_list[1] += 1
+
+    def run(self, iterations=20):
+        """
+        Play iterations games, report the results and the games per second
+        and return the player with the most wins
+        """
+        start = time.perf_counter()
+        for i in range(iterations):
+            PROFILER.start_game()
+            self.record_result(self.play_game())
+            PROFILER.end_game()
+        elapsed = time.perf_counter() - start
+
+        games_per_second = iterations / elapsed if elapsed > 0 else float("inf")
+        print("Played %d games in %.2fs (%.1f games/s)" % (iterations, elapsed, games_per_second))
+        print("Q-learner wins: %d, opponent wins: %d, ties: %d" % (self.win_list[0], self.win_list[1], self.ties))
+
+        index = self.win_list.index(max(self.win_list))
+        self.trainedComputer = self.p1 if index == 0 else self.p2
+        return self.trainedComputer
+
+
+def train_worker(connection, snapshot_path, seed, opponent_type, symmetric, opponent_options, capacity, eviction, record_path):
+    """
+    Keep a copy of the master Q table in a worker process, starting from the
+    table saved at snapshot_path. Every round the master sends the rows it
+    merged in the last round and the number of games to play, and the worker
+    sends back the rows the games updated along with the results. When the
+    opponent is a Q-learner both sides share one table, so every game is
+    self-play. The worker stops when the master sends None
+    """
+    random.seed(seed)
+    # the master repaired the log before starting the workers
+    recorder = None if record_path is None else GameRecorder(record_path, BOARD_SIZE[0], BOARD_SIZE[1], repair=False)
+    trainer = Trainer(opponent_type, symmetric, opponent_options, capacity, eviction, recorder)
+    trainer.p1.load(snapshot_path)
+    if opponent_type == "qlearner":
+        trainer.p2.player.q = trainer.p1.player.q
+    table = trainer.p1.player.q
+    try:
+        while True:
+            job = connection.recv()
+            if job is None:
+                break
+            (games, merged) = job
+            if merged is not None:
+                table.update_rows(merged[0].tolist(), merged[1], merged[2])
+            table.clear_counts()
+            trainer.win_list = [0, 0]
+            trainer.ties = 0
+            for i in range(games):
+                trainer.record_result(trainer.play_game())
+            connection.send((table.visited_rows(), trainer.win_list, trainer.ties))
+    finally:
+        table.close()
+        if recorder is not None:
+            recorder.close()
+
+
+class ParallelTrainer():
+    """A class that trains a Q-learner with a pool of worker processes. Every
+    round each worker plays its share of games on a local copy of the master
+    Q table and the values they update are merged back into the master table
+    by visit-weighted averaging. The workers keep their copies between rounds
+    and only receive the merged rows, so the work of the master each round
+    follows the games played rather than the size of the table"""
+
+    def __init__(self, opponent_type="qlearner", symmetric=False, processes=None, sync_games=500, opponent_options=None,
+                 capacity=None, eviction="lru", record_path=None):
+        """
+        Initialize the master Q-learner, processes defaults to the number of
+        cores and sync_games is how many games each worker plays per round.
+        capacity and eviction limit the master Q table and the copies of the
+        workers. The workers append every game to the game log at record_path
+        if there is one
+        """
+        self.p1 = ComputerPlayer(1, "qlearner", symmetric=symmetric, capacity=capacity, eviction=eviction)
+        self.opponent_type = opponent_type
+        self.opponent_options = opponent_options
+        self.symmetric = symmetric
+        self.capacity = capacity
+        self.eviction = eviction
+        self.processes = processes or os.cpu_count()
+        self.sync_games = sync_games
+        self.record_path = record_path
+        if record_path is not None:
+            # create the log, or check it, before the workers append to it
+            GameRecorder(record_path, BOARD_SIZE[0], BOARD_SIZE[1]).close()
+        self.trainedComputer = None
+        self.win_list = [0, 0]
+        self.ties = 0
+
+    def run(self, iterations=20):
+        """
+        Play iterations games across the worker processes, report the results
+        and the games per second and return the trained Q-learner
+        """
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            # workers map the starting table once instead of unpickling it
+            snapshot_path = os.path.join(snapshot_dir, 'master.qtable')
+            self.p1.save(snapshot_path)
+            workers = []
+            try:
+                for i in range(self.processes):
+                    (connection, worker_connection) = multiprocessing.Pipe()
+                    process = multiprocessing.Process(target=train_worker, daemon=True, args=(
+                        worker_connection, snapshot_path, random.getrandbits(64), self.opponent_type, self.symmetric,
+                        self.opponent_options, self.capacity, self.eviction, self.record_path))
+                    process.start()
+                    worker_connection.close()
+                    workers.append((process, connection))
+
+                merged = None
+                remaining = iterations
+                while remaining > 0:
+                    # every worker gets the merged rows, even with no games left to play
+                    for (process, connection) in workers:
+                        games = min(self.sync_games, remaining)
+                        remaining -= games
+                        connection.send((games, merged))
+                    results = [connection.recv() for (process, connection) in workers]
+                    merged = merge_tables(self.p1.player.q, [updates for (updates, win_list, ties) in results])
+                    for (updates, win_list, ties) in results:
+                        self.win_list[0] += win_list[0]
+                        self.win_list[1] += win_list[1]
+                        self.ties += ties
+            finally:
+                for (process, connection) in workers:
+                    try:
+                        connection.send(None)
+                    except OSError:
+                        # the worker is already gone
+                        pass
+                    connection.close()
+                for (process, connection) in workers:
+                    process.join()
+        elapsed = time.perf_counter() - start
+
+        games_per_second = iterations / elapsed if elapsed > 0 else float("inf")
+        print("Played %d games on %d processes in %.2fs (%.1f games/s)" % (iterations, self.processes, elapsed, games_per_second))
+        print("Q-learner wins: %d, opponent wins: %d, ties: %d" % (self.win_list[0], self.win_list[1], self.ties))
+
+        self.trainedComputer = self.p1
+        return self.trainedComputer
+
+
+def replay_game(game):
+    """
+    Replay a recorded game on a BitBoard and return the winner's coin type,
+    0 for a tie or an unfinished game, and the (coin type, previous state,
+    action, available actions, resulting state, game over) of every move,
+    the same values a Q-learner learns from after each of its moves
+    """
+    board = BitBoard(BOARD_SIZE[0], BOARD_SIZE[1])
+    game_logic = GameLogic(board)
+    transitions = []
+    game_over = False
+    for (column, coin_type) in zip(game.moves, game.coin_types()):
+        actions = board.get_available_actions()
+        coin = HeadlessCoin(coin_type)
+        coin.set_column(column)
+        game_over = board.insert_coin(coin, None, game_logic)
+        transitions.append((coin_type, board.get_prev_state_key(), column, actions, board.get_state_key(), game_over))
+        if game_over:
+            break
+    return (game_logic.get_winner(), transitions)
+
+
+class ReplayTrainer():
+    """A class that trains a Q-learner offline from the games of a game log
+    instead of playing them. Every move of both sides is learned from the
+    way self-play on a shared table learns, except that the last move of
+    the side that did not end a finished game also gets its reward for the
+    outcome, which QLearningPlayer.learn never gives, so replay does not
+    rebuild the table online play would. Replaying a game backwards, from
+    its last move, lets the final rewards of both sides reach their first
+    moves in a single sweep"""
+
+    def __init__(self, symmetric=False, capacity=None, eviction="lru", backward=True):
+        """
+        Initialize the Q-learner to train, see Trainer for the options of
+        its Q table. backward replays the moves of every game from last to
+        first
+        """
+        self.p1 = ComputerPlayer(1, "qlearner", symmetric=symmetric, capacity=capacity, eviction=eviction)
+        self.backward = backward
+        self.trainedComputer = None
+        self.skipped = 0
+
+    def learn_game(self, game):
+        """
+        Update the Q table from the moves of a recorded game and return the
+        number of moves learned from
+        """
+        try:
+            (winner_value, transitions) = replay_game(game)
+        except (ColumnFullException, IndexError):
+            # a move the board does not allow, the record is corrupt
+            self.skipped += 1
+            return 0
+        player = self.p1.player
+        rewards = [0] * len(transitions)
+        if transitions and transitions[-1][5]:
+            rewards[-1] = player.get_reward(winner_value, transitions[-1][0])
+            if len(transitions) > 1:
+                # the move before the last one is the other side's last
+                rewards[-2] = player.get_reward(winner_value, transitions[-2][0])
+        steps = list(zip(transitions, rewards))
+        if self.backward:
+            steps.reverse()
+        for ((coin_type, prev_state, action, actions, result_state, game_over), reward) in steps:
+            player.update(prev_state, action, reward, result_state, actions)
+        return len(transitions)
+
+    def run(self, path, sweeps=1):
+        """
+        Learn from every game of the log at path sweeps times, report the
+        games per second and return the trained Q-learner
+        """
+        with open(path, 'rb') as f:
+            (num_rows, num_columns, epoch) = read_header(f, path)
+        if (num_rows, num_columns) != BOARD_SIZE:
+            raise ValueError('%s records games on a %dx%d board' % (path, num_rows, num_columns))
+
+        start = time.perf_counter()
+        games = 0
+        moves = 0
+        for sweep in range(sweeps):
+            for game in read_games(path):
+                moves += self.learn_game(game)
+                games += 1
+        elapsed = time.perf_counter() - start
+
+        games_per_second = games / elapsed if elapsed > 0 else float("inf")
+        print("Replayed %d games (%d moves) in %.2fs (%.1f games/s)" % (games, moves, elapsed, games_per_second))
+        if self.skipped:
+            print("Skipped %d games with moves the board does not allow" % self.skipped)
+
+        self.trainedComputer = self.p1
+        return self.trainedComputer
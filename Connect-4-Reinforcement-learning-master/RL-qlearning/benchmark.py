@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from Board import BitBoard, Board
+from Constants import BOARD_SIZE
+from GameLogic import GameLogic
+from Trainer import HeadlessCoin, Trainer
+
+
+NOTEBOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RL-DQN', 'RL_DQN.ipynb')
+
+
+def random_games(rng, count):
+    """
+    Return count random games as lists of (column, coin type) moves
+    """
+    games = []
+    for i in range(count):
+        board = BitBoard(BOARD_SIZE[0], BOARD_SIZE[1])
+        game_logic = GameLogic(board)
+        coin_type = rng.randint(1, 2)
+        moves = []
+        game_over = False
+        while not game_over:
+            column = rng.choice(board.get_available_actions())
+            coin = HeadlessCoin(coin_type)
+            coin.set_column(column)
+            game_over = board.insert_coin(coin, None, game_logic)
+            moves.append((column, coin_type))
+            coin_type = 1 if coin_type == 2 else 2
+        games.append(moves)
+    return games
+
+
+def play_moves(board_class, moves):
+    """
+    Return a board and its GameLogic after playing moves on a new board
+    """
+    board = board_class(BOARD_SIZE[0], BOARD_SIZE[1])
+    game_logic = GameLogic(board)
+    for (column, coin_type) in moves:
+        coin = HeadlessCoin(coin_type)
+        coin.set_column(column)
+        board.insert_coin(coin, None, game_logic)
+    return (board, game_logic)
+
+
+def mid_game_boards(rng, games, board_class=Board):
+    """
+    Return boards and their GameLogic objects stopped at a random move of
+    each game
+    """
+    boards = []
+    for moves in games:
+        boards.append(play_moves(board_class, moves[:rng.randint(1, len(moves) - 1)]))
+    return boards
+
+
+def time_batches(call, items, batch):
+    """
+    Call call on every item in batches of batch calls and return the
+    (elapsed seconds, calls) of every batch
+    """
+    samples = []
+    for start in range(0, len(items), batch):
+        chunk = items[start:start + batch]
+        t0 = time.perf_counter()
+        for item in chunk:
+            call(item)
+        samples.append((time.perf_counter() - t0, len(chunk)))
+    return samples
+
+
+def bench_insert_coin(rng, scale, board_class):
+    """
+    Time insert_coin over whole random games, one sample per game
+    """
+    samples = []
+    for moves in random_games(rng, 40 * scale):
+        board = board_class(BOARD_SIZE[0], BOARD_SIZE[1])
+        game_logic = GameLogic(board)
+        coins = []
+        for (column, coin_type) in moves:
+            coin = HeadlessCoin(coin_type)
+            coin.set_column(column)
+            coins.append(coin)
+        t0 = time.perf_counter()
+        for coin in coins:
+            board.insert_coin(coin, None, game_logic)
+        samples.append((time.perf_counter() - t0, len(coins)))
+    return samples
+
+
+def bench_update_slot_tracker(rng, scale):
+    """
+    Time the win tracking update for the last move of mid-game boards
+    """
+    items = []
+    for (board, game_logic) in mid_game_boards(rng, random_games(rng, 200 * scale)):
+        (row, column, value) = board.prev_move
+        items.append((board, row, column, value))
+    return time_batches(lambda item: item[0].update_slot_tracker(item[1], item[2], item[3]), items * 5, 100)
+
+
+def bench_check_game_over(rng, scale):
+    """
+    Time GameLogic.check_game_over on mid-game boards
+    """
+    items = [game_logic for (board, game_logic) in mid_game_boards(rng, random_games(rng, 200 * scale))]
+    return time_batches(lambda game_logic: game_logic.check_game_over(), items * 5, 100)
+
+
+def bench_get_available_actions(rng, scale):
+    """
+    Time Board.get_available_actions on mid-game boards
+    """
+    items = [board for (board, game_logic) in mid_game_boards(rng, random_games(rng, 200 * scale))]
+    return time_batches(lambda board: board.get_available_actions(), items * 5, 100)
+
+
+def trained_player(rng, scale):
+    """
+    Return a Q-learner trained by a few random-opponent games and mid-game
+    boards to query it with
+    """
+    random.seed(rng.random())
+    trainer = Trainer("random")
+    for i in range(200 * scale):
+        trainer.play_game()
+    return (trainer.p1.player, mid_game_boards(rng, random_games(rng, 200 * scale)))
+
+
+def bench_getq(rng, scale):
+    """
+    Time QLearningPlayer.getQ on the states of mid-game boards
+    """
+    (player, boards) = trained_player(rng, scale)
+    items = [(board.get_state_key(), rng.choice(board.get_available_actions())) for (board, game_logic) in boards]
+    return time_batches(lambda item: player.getQ(item[0], item[1]), items * 5, 100)
+
+
+def bench_choose_action(rng, scale):
+    """
+    Time QLearningPlayer.choose_action on the states of mid-game boards
+    """
+    (player, boards) = trained_player(rng, scale)
+    items = [(board.get_state_key(), board.get_available_actions()) for (board, game_logic) in boards]
+    return time_batches(lambda item: player.choose_action(item[0], item[1]), items * 5, 100)
+
+
+def bench_learn(rng, scale):
+    """
+    Time QLearningPlayer.learn for the last move of mid-game boards
+    """
+    (player, boards) = trained_player(rng, scale)
+    items = [(board, board.get_available_actions(), board.prev_move[1], game_logic) for (board, game_logic) in boards]
+    return time_batches(lambda item: player.learn(item[0], item[1], item[2], False, item[3]), items * 5, 100)
+
+
+def bench_games(rng, scale):
+    """
+    Time whole headless games of a Q-learner against a random player, one
+    sample per game
+    """
+    random.seed(rng.random())
+    trainer = Trainer("random")
+    samples = []
+    for i in range(200 * scale):
+        t0 = time.perf_counter()
+        trainer.play_game()
+        samples.append((time.perf_counter() - t0, 1))
+    return samples
+
+
+def load_notebook_environment():
+    """
+    Return the Environment class of the DQN notebook, running the notebook
+    cells that define it and its helpers
+    """
+    import numpy
+    with open(NOTEBOOK_PATH) as f:
+        notebook = json.load(f)
+    namespace = {'np': numpy}
+    for cell in notebook['cells']:
+        source = ''.join(cell['source'])
+        if cell['cell_type'] == 'code' and ('def same(' in source or 'class Environment' in source):
+            exec(source, namespace)
+    return namespace['Environment']
+
+
+def notebook_positions(rng, scale):
+    """
+    Return DQN notebook Environments holding random positions
+    """
+    Environment = load_notebook_environment()
+    items = []
+    for i in range(200 * scale):
+        env = Environment()
+        for k in range(rng.randint(1, env.R * env.C - 1)):
+            env.step(rng.randint(1, 2), rng.randrange(env.C))
+        items.append(env)
+    return items
+
+
+def bench_is_final(rng, scale):
+    """
+    Time the DQN notebook's Environment.isFinal on random positions
+    """
+    return time_batches(lambda env: env.isFinal(), notebook_positions(rng, scale), 20)
+
+
+def bench_is_final_move(rng, scale):
+    """
+    Time the DQN notebook's Environment.isFinalMove on random positions
+    """
+    return time_batches(lambda env: env.isFinalMove(), notebook_positions(rng, scale), 20)
+
+
+BENCHMARKS = [
+    ("board_insert_coin", lambda rng, scale: bench_insert_coin(rng, scale, Board)),
+    ("bitboard_insert_coin", lambda rng, scale: bench_insert_coin(rng, scale, BitBoard)),
+    ("board_update_slot_tracker", bench_update_slot_tracker),
+    ("gamelogic_check_game_over", bench_check_game_over),
+    ("board_get_available_actions", bench_get_available_actions),
+    ("qlearner_getq", bench_getq),
+    ("qlearner_choose_action", bench_choose_action),
+    ("qlearner_learn", bench_learn),
+    ("games_random_vs_qlearner", bench_games),
+    ("environment_is_final", bench_is_final),
+    ("environment_is_final_move", bench_is_final_move),
+]
+
+
+def percentile(values, fraction):
+    """
+    Return the value below which fraction of the sorted values fall
+    """
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(samples):
+    """
+    Return the ops per second and the latency percentiles, in microseconds
+    per call, of a list of (elapsed seconds, calls) samples
+    """
+    elapsed = sum(sample[0] for sample in samples)
+    calls = sum(sample[1] for sample in samples)
+    latencies = sorted(1e6 * sample[0] / sample[1] for sample in samples)
+    return {
+        "calls": calls,
+        "ops_per_second": calls / elapsed if elapsed > 0 else float("inf"),
+        "p50_us": percentile(latencies, 0.5),
+        "p90_us": percentile(latencies, 0.9),
+        "p99_us": percentile(latencies, 0.99),
+    }
+
+
+def run(seed=0, scale=1, only=None):
+    """
+    Run every benchmark, or those named in only, with a fresh generator
+    seeded with seed and return their summaries
+    """
+    results = {}
+    for (name, bench) in BENCHMARKS:
+        if only and name not in only:
+            continue
+        try:
+            samples = bench(random.Random(seed), scale)
+        except ImportError as e:
+            print("%-28s skipped: %s" % (name, e))
+            continue
+        results[name] = summarize(samples)
+        print("%-28s %14.1f ops/s  p50 %9.2fus  p90 %9.2fus  p99 %9.2fus" % (
+            name, results[name]["ops_per_second"], results[name]["p50_us"],
+            results[name]["p90_us"], results[name]["p99_us"]))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change in ops per second of every benchmark against the
+    baseline and return the names of those slower by more than tolerance
+    """
+    regressions = []
+    for (name, result) in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result["ops_per_second"] / baseline[name]["ops_per_second"]
+        slower = ratio < 1.0 - tolerance
+        print("%-28s %7.2fx%s" % (name, ratio, "  REGRESSION" if slower else ""))
+        if slower:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random games and positions")
+    parser.add_argument('--scale', type=int, default=1, help="Multiplier of the number of samples")
+    parser.add_argument('--only', nargs='*', help="Names of the benchmarks to run")
+    parser.add_argument('--output', help="File to write the results to as JSON")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Fraction of ops per second that may be lost before it counts as a regression")
+    args = parser.parse_args()
+
+    results = run(args.seed, args.scale, args.only)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "seed": args.seed,
+                "scale": args.scale,
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "board_size": BOARD_SIZE,
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
@@ -1,216 +1,84 @@
-import pygame
-import random
 import argparse
-
-# define some global variables
-BLUE = (0, 0, 255)
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BOARD_SIZE = (7,6)
-
-class ColumnFullException(Exception):
-    """An exception that will be thrown if a column of the board is full"""
-    def __init__(self, value):
-        self.value = value
-
-    def __str__(self):
-        return repr(self.value)
-
-class Coin():
-    """A class that represents the coin pieces used in connect 4"""
-
-    RADIUS = 30
-
-    def __init__(self, coin_type):
-        """
-        Initialize a coin with a given coin_type
-        (integer that represents its color)
-        """
-        self.coin_type = coin_type
-        self.surface = pygame.Surface((Slot.SIZE - 3, Slot.SIZE - 3))
-        if (self.coin_type == 1):
-            self.color = BLUE
-        else:
-            self.color = RED
-
-    def set_position(self, x1, y1):
-        """
-        Set the position of the coin on the screen
-        """
-        self.x_pos = x1
-        self.y_pos = y1
-
-    def set_column(self, col):
-        """
-        Set the column on the board in which the coin belongs
-        """
-        self.col = col
-
-    def get_column(self):
-        """
-        Get the column on the board in which the coin belongs in
-        """
-        return self.col
-
-    def set_row(self, row):
-        """
-        Set the row on the board where the coin is
-        """
-        self.row = row
-
-    def get_row(self):
-        """
-        Get the row on the board in which the coin belongs
-        """
-        return self.row
-
-    def move_right(self, background, step=1):
-        """
-        Move the coin to the column that is right of its current column
-        """
-        self.set_column(self.col + 1)
-        self.surface.fill((0,0,0))
-        background.blit(self.surface, (self.x_pos, self.y_pos))
-        self.set_position(self.x_pos + step * Slot.SIZE, self.y_pos)
-        self.draw(background)
-
-    def move_left(self, background):
-        """
-        Move the coin to the column that is left of its current column
-        """
-        self.set_column(self.col - 1)
-        self.surface.fill((0,0,0))
-        background.blit(self.surface, (self.x_pos, self.y_pos))
-        self.set_position(self.x_pos - Slot.SIZE, self.y_pos)
-        self.draw(background)
-
-    def drop(self, background, row_num):
-        """
-        Drop the coin to the bottom most possible slot in its column
-        """
-        self.set_row(row_num)
-        self.surface.fill((0,0,0))
-        background.blit(self.surface, (self.x_pos, self.y_pos))
-        self.set_position(self.x_pos, self.y_pos + ((self.row + 1) * Slot.SIZE))
-        self.surface.fill((255,255,255))
-        background.blit(self.surface, (self.x_pos, self.y_pos))
-        self.draw(background)
-
-    def get_coin_type(self):
-        """
-        Return the coin type
-        """
-        return self.coin_type
-
-    def draw(self, background):
-        """
-        Draw the coin on the screen
-        """
-        pygame.draw.circle(self.surface, self.color, (Slot.SIZE // 2, Slot.SIZE // 2), Coin.RADIUS)
-        self.surface = self.surface.convert()
-        background.blit(self.surface, (self.x_pos, self.y_pos))
-
-
-
-class GameLogic():
-    """A class that handles win conditions and determines winner"""
-    WIN_SEQUENCE_LENGTH = 4
-
-    def __init__(self, board):
-        """
-        Initialize the GameLogic object with a reference to the game board
-        """
-        self.board = board
-        (num_rows, num_columns) = self.board.get_dimensions()
-        self.board_rows = num_rows
-        self.board_cols = num_columns
-        self.winner_value = 0
-
-    def check_game_over(self):
-        """
-        Check whether the game is over which can be because of a tie or one
-        of two players have won
-        """
-        (last_visited_nodes, player_value) = self.board.get_last_filled_information()
-        representation = self.board.get_representation()
-        player_won = self.search_win(last_visited_nodes, representation)
-        if player_won:
-            self.winner_value = player_value
-
-        return ( player_won or self.board.check_board_filled() )
-
-
-
-    def search_win(self, last_visited_nodes, representation):
-        """
-        Determine whether one of the players have won
-        """
-        for indices in last_visited_nodes:
-            current_node = representation[indices[0]][indices[1]]
-            if ( current_node.top_left_score == GameLogic.WIN_SEQUENCE_LENGTH or
-                 current_node.top_score == GameLogic.WIN_SEQUENCE_LENGTH or
-                 current_node.top_right_score == GameLogic.WIN_SEQUENCE_LENGTH or
-                 current_node.left_score == GameLogic.WIN_SEQUENCE_LENGTH or
-                 current_node.right_score == GameLogic.WIN_SEQUENCE_LENGTH or
-                 current_node.bottom_left_score == GameLogic.WIN_SEQUENCE_LENGTH or
-                 current_node.bottom_score == GameLogic.WIN_SEQUENCE_LENGTH or
-                 current_node.bottom_right_score == GameLogic.WIN_SEQUENCE_LENGTH ):
-                return True
-
-        return False
-
-    def determine_winner_name(self):
-        """
-        Return the winner's name
-        """
-        if (self.winner_value == 1):
-            return "BLUE"
-        elif (self.winner_value == 2):
-            return "RED"
-        else:
-            return "TIE"
-
-    def get_winner(self):
-        """
-        Return the winner coin type value
-        """
-        return self.winner_value
-
-
-class SlotTrackerNode():
-    """A class that that represents the node in the internal graph
-    representation of the game board"""
-
-    def __init__(self):
-        """
-        Initialize the SlotTrackerNode with pointers to Nodes in all
-        8 directions surrounding along with a score count in each direction
-        """
-        self.top_left = None
-        self.top_right = None
-        self.top = None
-        self.left = None
-        self.right = None
-        self.bottom_left = None
-        self.bottom = None
-        self.bottom_right = None
-        self.top_left_score = 1
-        self.top_right_score = 1
-        self.top_score = 1
-        self.left_score = 1
-        self.right_score = 1
-        self.bottom_left_score = 1
-        self.bottom_score = 1
-        self.bottom_right_score = 1
-        self.value = 0
-        self.visited = False
+import os
 
 
 if __name__ == "__main__":
+    from Constants import BOARD_SIZE
+    from GameRecord import GameRecorder
+    from OpeningBook import OpeningBook
+    from Players import ComputerPlayer
+    from Profiler import PROFILER
+    from Trainer import ParallelTrainer, ReplayTrainer, Trainer
+
     parser = argparse.ArgumentParser()
     parser.add_argument('iterations', nargs='?', default=20, action="store", help="Store the number of iterations to train computer")
+    parser.add_argument('--headless', action="store_true", help="Train the computer without opening a window and report games per second")
+    parser.add_argument('--opponent', default="qlearner", choices=["qlearner", "random", "search", "mcts"], help="The player type the computer trains against in headless mode")
+    parser.add_argument('--computer', default="qlearner", choices=["qlearner", "search", "mcts", "dqn"], help="The player type played against in vs Computer mode")
+    parser.add_argument('--search-time', type=float, default=0.5, help="Seconds a search or MCTS player may think about each move")
+    parser.add_argument('--symmetric', action="store_true", help="Let the Q-learners share the values of mirrored positions, use it again when loading a table trained with it")
+    parser.add_argument('--sync-games', type=int, default=500, help="Number of games every worker process plays between two merges of the Q tables")
+    parser.add_argument('--capacity', type=int, help="Most states the Q table of a Q-learner keeps in memory, evicting others once it is full")
+    parser.add_argument('--eviction', default="lru", choices=["lru", "visits"], help="Evict the least recently used or the least visited states of a full Q table")
+    parser.add_argument('--processes', type=int, default=1, help="Number of worker processes for headless training, 0 uses every core")
+    parser.add_argument('--dqn-weights', default="connect_4_model.npz", help="Weights exported by the DQN notebook for the dqn computer")
+    parser.add_argument('--book', help="Opening book file generated by OpeningBook.py for the computer to play from in vs Computer mode")
+    parser.add_argument('--qtable', help="Q table file to load the computer from if it exists, headless training saves the trained computer to it")
+    parser.add_argument('--record', metavar="PATH", help="Game log to append every game played to, GameRecord.py summarizes it")
+    parser.add_argument('--replay', metavar="PATH", help="Train the computer offline from the games of a game log instead of playing, saving it to --qtable")
+    parser.add_argument('--sweeps', type=int, default=1, help="Number of times --replay learns from every game of the log")
+    parser.add_argument('--forward', action="store_true", help="Replay every game from its first move instead of its last")
+    parser.add_argument('--profile', action="store_true", help="Time rendering, board updates, win checks, move choices and learning and print a summary at the end")
+    parser.add_argument('--cprofile', type=int, default=0, metavar="GAMES", help="With --profile, also run the first GAMES games under cProfile, including the moves the computer chooses on its own thread")
+    parser.add_argument('--cprofile-output', default="connect4.prof", help="File to write the cProfile statistics to")
     args = parser.parse_args()
-
-    GameView(1200, 760).main_menu(int(args.iterations))
+    if args.replay is not None and args.qtable is None:
+        parser.error("--replay needs --qtable to save the trained computer to")
+    if args.cprofile and not args.profile:
+        parser.error("--cprofile needs --profile")
+    if args.profile:
+        PROFILER.enable(args.cprofile, args.cprofile_output)
+    saved = args.qtable is not None and os.path.exists(args.qtable)
+    recorder = None
+    if args.record is not None:
+        recorder = GameRecorder(args.record, BOARD_SIZE[0], BOARD_SIZE[1])
+    search_options = {"time_budget": args.search_time}
+
+    if args.replay is not None:
+        trainer = ReplayTrainer(args.symmetric, args.capacity, args.eviction, backward=not args.forward)
+        if saved:
+            trainer.p1.load(args.qtable)
+        trainer.run(args.replay, args.sweeps)
+        trainer.p1.save(args.qtable)
+    elif args.headless:
+        if args.processes == 1:
+            trainer = Trainer(args.opponent, args.symmetric, search_options, args.capacity, args.eviction, recorder)
+        else:
+            trainer = ParallelTrainer(args.opponent, args.symmetric, args.processes or None,
+                                      sync_games=args.sync_games, opponent_options=search_options,
+                                      capacity=args.capacity, eviction=args.eviction,
+                                      record_path=args.record)
+        if saved:
+            trainer.p1.load(args.qtable)
+        trainer.run(int(args.iterations))
+        if args.qtable is not None:
+            trainer.p1.save(args.qtable)
+    else:
+        # only the window needs pygame, headless training never imports it
+        from GameView import GameView
+        if args.computer == "qlearner":
+            computer_options = {"symmetric": args.symmetric, "capacity": args.capacity, "eviction": args.eviction}
+        elif args.computer == "dqn":
+            computer_options = {"weights": args.dqn_weights}
+        else:
+            computer_options = dict(search_options)
+        if args.book is not None:
+            computer_options["opening_book"] = OpeningBook(args.book)
+        view = GameView(1200, 760, computer_type=args.computer, computer_options=computer_options, recorder=recorder)
+        if saved and args.computer == "qlearner":
+            view.trainedComputer = ComputerPlayer(2, "qlearner", **computer_options)
+            view.trainedComputer.load(args.qtable)
+        view.main_menu(int(args.iterations))
+    if recorder is not None:
+        recorder.close()
+    PROFILER.report()